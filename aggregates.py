@@ -0,0 +1,68 @@
+"""
+Constant-size aggregate states.
+
+A state is [rows, count, sum, min, max]: the number of rows seen, and the count, sum, minimum
+and maximum of the numeric values among them. One state answers count/sum/avg/min/max for a
+column, and two states over disjoint rows merge into the state of their union, which is what
+spilling and parallel aggregation rely on.
+"""
+
+AGGREGATE_FUNCTIONS = ('count', 'sum', 'avg', 'min', 'max')
+
+
+def new_state():
+    return [0, 0, 0, None, None]
+
+
+def update_state(state, value):
+    """Add one value to a state; values that are not numbers only count as rows."""
+    state[0] += 1
+    if not isinstance(value, (int, float)):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return
+    state[1] += 1
+    state[2] += value
+    if state[3] is None or value < state[3]:
+        state[3] = value
+    if state[4] is None or value > state[4]:
+        state[4] = value
+
+
+def values_state(values):
+    """The state of a list of values, as update_state would build it; lists of numbers are summarised with builtins."""
+    state = new_state()
+    numbers = [value for value in values if isinstance(value, (int, float))]
+    if len(numbers) < len(values):
+        for value in values:
+            update_state(state, value)
+    elif numbers:
+        state[:] = [len(numbers), len(numbers), sum(numbers), min(numbers), max(numbers)]
+    return state
+
+
+def merge_states(state, other):
+    """Merge other into state, both computed over disjoint rows."""
+    state[0] += other[0]
+    state[1] += other[1]
+    state[2] += other[2]
+    if other[3] is not None and (state[3] is None or other[3] < state[3]):
+        state[3] = other[3]
+    if other[4] is not None and (state[4] is None or other[4] > state[4]):
+        state[4] = other[4]
+
+
+def finalize(function, state):
+    """The value of an aggregate function over the rows of a state."""
+    if function == 'count':
+        return state[0]
+    elif function == 'sum':
+        return state[2]
+    elif function == 'avg':
+        return state[2] / state[1] if state[1] else 0
+    elif function == 'min':
+        return state[3]
+    elif function == 'max':
+        return state[4]
+    raise ValueError(f"Unsupported aggregate function: {function}")
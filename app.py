@@ -1,4 +1,5 @@
-from flask import Flask, request, jsonify
+import json
+from flask import Flask, Response, request, jsonify
 from cli import DatabaseCLI
 from flask_cors import CORS
 from rdb import API
@@ -12,6 +13,41 @@ CORS(app)
 cli = DatabaseCLI()
 api = API()
 
+SERVER_THREADS = 8  # Requests served at once when waitress is installed
+
+def wants_compact():
+    # ...&compact=1 drops the indentation and the spaces after separators
+    return request.args.get('compact', '').lower() in ('1', 'true', 'yes')
+
+def stream_rows(rows, mode, prefix='[', suffix=']'):
+    """
+    Send rows while they are produced instead of building the whole body first.
+    mode 'ndjson' sends one compact JSON object per line; anything else sends one JSON document,
+    prefix, the rows as array elements, then suffix.
+    """
+    def ndjson():
+        try:
+            for row in rows:
+                yield json.dumps(row, separators=(',', ':')) + '\n'
+        except Exception as e:
+            # Headers are already sent, so the error goes in the last line
+            yield json.dumps({"error": str(e)}) + '\n'
+
+    def json_array():
+        yield prefix
+        i = 0
+        try:
+            for i, row in enumerate(rows, 1):
+                yield (',' if i > 1 else '') + json.dumps(row, separators=(',', ':'))
+        except Exception as e:
+            # Headers are already sent, so the error goes in the last element
+            yield (',' if i else '') + json.dumps({"error": str(e)})
+        yield suffix
+
+    if mode == 'ndjson':
+        return Response(ndjson(), mimetype='application/x-ndjson')
+    return Response(json_array(), mimetype='application/json')
+
 @app.route('/')
 def home():
     return app.send_static_file("index.html")
@@ -25,8 +61,16 @@ def run_command():
     try:
         command = request.args['command']
         print(command)
-        output = cli.process_command(command)
+        # Values for the '?' placeholders of a prepared query: ...&param=1&param=a
+        params = request.args.getlist('param')
+        # ...&stream=ndjson or ...&stream=json sends the rows of a select as they are found
+        mode = request.args.get('stream')
+        if mode and command.startswith('select'):
+            return stream_rows(cli.db.stream(command, params), mode, prefix='{"output":[', suffix=']}')
+        output = cli.process_command(command, params)
         print(output)
+        if wants_compact():
+            return Response(json.dumps({"output": output}, separators=(',', ':')), mimetype='application/json')
         return jsonify({"output": output})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -70,14 +114,32 @@ def ysh_command():
         command = request.args['command']
         print(command)
         print(isinstance(command, str))
-        output = api.handle_input(command)
+        params = request.args.getlist('param')
+        mode = request.args.get('stream')
+        rows = api.stream(command, params) if mode else None
+        if rows is not None:
+            return stream_rows(rows, mode)
+        output = api.handle_input(command, params, wants_compact())
         print(output)
         return output
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/cache-stats')
+def cache_stats():
+    # Hit and miss counters of both engines' query result caches
+    return jsonify({"mydb": cli.db.result_cache.stats(), "ysh": api.result_cache.stats()})
+
 if __name__ == "__main__":
-    app.run(port=8080, debug=True)
+    # Both engines lock per table, so requests are served concurrently
+    try:
+        from waitress import serve  # Production WSGI server with a fixed pool of worker threads
+    except ImportError:
+        serve = None
+    if serve is not None:
+        serve(app, port=8080, threads=SERVER_THREADS)
+    else:
+        app.run(port=8080, debug=True, threaded=True)
 
 # @app.route('/eventSearch')
 # def eventSearch():
@@ -1,4 +1,5 @@
 # cli.py
+import re
 from db import MyDB
 from queryParser import SQLParser
 
@@ -13,9 +14,11 @@ class DatabaseCLI:
                 break
             self.process_command(command)
 
-    def process_command(self, command):
+    def process_command(self, command, params=()):
         try:
-            if command.startswith('create'):
+            if command.lower().startswith('create index'):
+                return self.create_index(command)
+            elif command.startswith('create'):
                 return self.create_table(command)
             elif command.startswith('insert'):
                 return self.insert_data(command)
@@ -24,7 +27,13 @@ class DatabaseCLI:
             elif command.startswith('update'):
                 return self.update_data(command)
             elif command.startswith('select'):
-                return self.query_data(command)
+                return self.query_data(command, params)
+            elif command.startswith('convert'):
+                return self.convert_table(command)
+            elif command.lower().startswith('analyze'):
+                return self.analyze_table(command)
+            elif command.lower().startswith('explain'):
+                return self.explain_query(command, params)
             # Add more commands as needed
             else:
                 print("Unknown command")
@@ -67,10 +76,32 @@ class DatabaseCLI:
             print(f"Unexpected error: {e}")
             return f"Unexpected error: {e}"
 
+    def create_index(self, command):
+        """
+        Parses a create index command and creates an index on a table column.
+        Command format: create index on table_name(column) [using hash|btree]
+        """
+        try:
+            match = re.fullmatch(r"create\s+index\s+on\s+(\w+)\s*\(\s*(\w+)\s*\)(?:\s+using\s+(\w+))?", command.strip(), re.IGNORECASE)
+            if not match:
+                raise ValueError("Invalid command format for create index.")
+
+            table_name, column, kind = match.groups()
+
+            # Calling the create_index method of MyDB, hash indexes answer equality only
+            return self.db.create_index(table_name, column, (kind or 'hash').lower())
+
+        except ValueError as e:
+            print(f"Error: {e}")
+            return f"Error: {e}"
+        except Exception as e:
+            print(f"Unexpected error: {e}")
+            return f"Unexpected error: {e}"
+
     def insert_data(self, command):
         """
         Parses an insert command and inserts data into a table.
-        Command format: insert into table_name (column1, column2, ...) values (value1, value2, ...)
+        Command format: insert into table_name (column1, column2, ...) values (value1, value2, ...)[, (value1, value2, ...) ...]
         """
         try:
             parts = command.split(' ', 3)
@@ -79,23 +110,32 @@ class DatabaseCLI:
 
             table_name, rest = parts[2], parts[3]
             columns_part, values_part = rest.split(' values ')
+            columns_part, values_part = columns_part.strip(), values_part.strip()
 
             if not columns_part.startswith('(') or not columns_part.endswith(')') or not values_part.startswith('(') or not values_part.endswith(')'):
                 raise ValueError("Invalid command format. Columns and values must be enclosed in parentheses.")
 
-            # Extracting column names and values
+            # Extracting column names and one value tuple per row
             columns = [col.strip() for col in columns_part[1:-1].split(',')]
-            values = [value.strip() for value in values_part[1:-1].split(',')]
+            if not re.fullmatch(r"\([^()]*\)(\s*,\s*\([^()]*\))*", values_part):
+                raise ValueError("Invalid command format. Value tuples must be separated by commas.")
+            value_tuples = re.findall(r"\(([^()]*)\)", values_part)
+
+            rows = []
+            for value_tuple in value_tuples:
+                values = [value.strip() for value in value_tuple.split(',')]
 
-            if len(columns) != len(values):
+                if len(columns) != len(values):
 
-                raise ValueError("The number of columns and values must be the same.")
+                    raise ValueError("The number of columns and values must be the same.")
 
-            # Creating a dictionary of column-value pairs
-            data = dict(zip(columns, values))
+                # Creating a dictionary of column-value pairs
+                rows.append(dict(zip(columns, values)))
 
-            # Calling the insert method of MyDB
-            return self.db.insert(table_name, data)
+            # Calling the insert method of MyDB, batching multi-row inserts into one write
+            if len(rows) == 1:
+                return self.db.insert(table_name, rows[0])
+            return self.db.insert_many(table_name, rows)
 
         except ValueError as e:
             print(f"Error: {e}")
@@ -157,17 +197,74 @@ class DatabaseCLI:
             print(f"Unexpected error: {e}")
             return f"Unexpected error: {e}"
 
-    def query_data(self, command):
+    def convert_table(self, command):
+        """
+        Parses a convert command and converts a table to another storage format.
+        Command format: convert table table_name to json|columnar
+        """
+        try:
+            match = re.fullmatch(r"convert\s+table\s+(\w+)\s+to\s+(\w+)", command.strip(), re.IGNORECASE)
+            if not match:
+                raise ValueError("Invalid command format for convert.")
+
+            table_name, storage_format = match.groups()
+
+            # Calling the convert_table method of MyDB
+            return self.db.convert_table(table_name, storage_format.lower())
+
+        except ValueError as e:
+            print(f"Error: {e}")
+            return f"Error: {e}"
+        except Exception as e:
+            print(f"Unexpected error: {e}")
+            return f"Unexpected error: {e}"
+
+    def analyze_table(self, command):
+        """
+        Parses an analyze command and collects the table's statistics for the query planner.
+        Command format: analyze table_name
+        """
+        try:
+            match = re.fullmatch(r"analyze\s+(\w+)", command.strip(), re.IGNORECASE)
+            if not match:
+                raise ValueError("Invalid command format for analyze.")
+
+            # Calling the analyze method of MyDB
+            return self.db.analyze(match.group(1))
+
+        except ValueError as e:
+            print(f"Error: {e}")
+            return f"Error: {e}"
+        except Exception as e:
+            print(f"Unexpected error: {e}")
+            return f"Unexpected error: {e}"
+
+    def explain_query(self, command, params=()):
+        """
+        Shows the plan a query would run with.
+        Command format: explain select ...
+        params are bound to the '?' placeholders of the query, in order.
+        """
+        try:
+            plan = self.db.explain(command.strip()[len('explain'):].strip(), params)
+            print(plan)
+            return plan
+        except Exception as e:
+            print(f"Error in query planning: {e}")
+            return f"Error in query planning: {e}"
+
+    def query_data(self, command, params=()):
         """
         Parses a query command and retrieves data from a table.
         Command format: query table_name where condition
+        params are bound to the '?' placeholders of the condition, in order.
         """
         try:
             # Use the SQLParser to parse the query
             # parsed_query = SQLParser().parse(command)
 
             # Execute the query using MyDB
-            result = self.db.query(command)
+            result = self.db.query(command, params=params)
             for row in result:
                 print(row)
             return result
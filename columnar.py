@@ -0,0 +1,128 @@
+import json
+import mmap
+import os
+from array import array
+
+# Typecode and file extension of the fixed-width column types
+FIXED_WIDTH_TYPES = {
+    'int': ('q', 'i64'),
+    'float': ('d', 'f64'),
+}
+META_FILE = '_meta.json'
+
+
+def column_files(directory, column, data_type):
+    """Files holding a column: one typed array, or offsets plus UTF-8 bytes for strings."""
+    if data_type in FIXED_WIDTH_TYPES:
+        return [os.path.join(directory, f"{column}.{FIXED_WIDTH_TYPES[data_type][1]}")]
+    return [os.path.join(directory, f"{column}.off"), os.path.join(directory, f"{column}.str")]
+
+
+def write_file(path, data):
+    # Write next to the target and swap it in, so readers never see a half-written column
+    with open(path + '.tmp', 'wb') as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(path + '.tmp', path)
+
+
+def encode_column(values, data_type):
+    """Encode a column's values to the bytes of each of its files."""
+    if data_type in FIXED_WIDTH_TYPES:
+        return [array(FIXED_WIDTH_TYPES[data_type][0], values).tobytes()]
+
+    encoded = [str(value).encode('utf-8') for value in values]
+    offsets = array('Q', [0])
+    position = 0
+    for value in encoded:
+        position += len(value)
+        offsets.append(position)
+    return [offsets.tobytes(), b''.join(encoded)]
+
+
+def write_table(directory, schema, rows):
+    """
+    Write rows as one file per column under directory.
+    Every row must have every column of the schema, since the format has no nulls.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for column, data_type in schema.items():
+        try:
+            values = [row[column] for row in rows]
+        except KeyError:
+            raise ValueError(f"Every row needs a value for column '{column}' in the columnar format.")
+        for path, data in zip(column_files(directory, column, data_type), encode_column(values, data_type)):
+            write_file(path, data)
+
+    # The meta file is written last and marks the table as complete
+    with open(os.path.join(directory, META_FILE + '.tmp'), 'w') as file:
+        json.dump({'row_count': len(rows), 'schema': schema}, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(os.path.join(directory, META_FILE + '.tmp'), os.path.join(directory, META_FILE))
+
+
+def map_file(path):
+    """Memory-map a file read-only; empty files cannot be mapped and read as no bytes."""
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class StringColumn:
+    """A string column read lazily from its memory-mapped offsets and bytes."""
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return max(len(self.offsets) - 1, 0)
+
+    def __getitem__(self, i):
+        return str(self.data[self.offsets[i]:self.offsets[i + 1]], 'utf-8')
+
+    def __iter__(self):
+        return iter(self.values(0, len(self)))
+
+    def values(self, start, end):
+        """The strings of rows start to end, decoded in one pass."""
+        offsets, data = self.offsets, self.data
+        return [str(data[offsets[i]:offsets[i + 1]], 'utf-8') for i in range(start, end)]
+
+    def tolist(self):
+        return list(self)
+
+
+class ColumnarTable:
+    """
+    A table stored by write_table, with each column file memory-mapped on first use.
+    Scanning one column only touches that column's bytes.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE), 'r') as file:
+            meta = json.load(file)
+        self.row_count = meta['row_count']
+        self.schema = meta['schema']
+        self.columns = {}
+
+    def column(self, column):
+        """A typed, zero-copy view of a column: a memoryview for numbers, a StringColumn for strings."""
+        if column not in self.columns:
+            data_type = self.schema[column]
+            files = [map_file(path) for path in column_files(self.directory, column, data_type)]
+            if data_type in FIXED_WIDTH_TYPES:
+                self.columns[column] = memoryview(files[0]).cast(FIXED_WIDTH_TYPES[data_type][0])
+            else:
+                self.columns[column] = StringColumn(memoryview(files[0]).cast('Q'), files[1])
+        return self.columns[column]
+
+    def rows(self):
+        """Materialize the table as a list of row dicts."""
+        names = list(self.schema)
+        values = [self.column(column).tolist() for column in names]
+        return [dict(zip(names, row)) for row in zip(*values)]
@@ -1,14 +1,202 @@
 import csv
+import heapq
+import itertools
 import json
+import multiprocessing
+import operator
 import os
 import re
+import planner
+import shutil
+import threading
+import vectorized
+from aggregates import finalize, merge_states, values_state
+from cache import LRUCache
+from concurrent.futures import ProcessPoolExecutor
+from columnar import META_FILE, ColumnarTable, write_table
+from indexes import build_index, load_index, save_index
+from locks import TableLocks
+from wal import WriteAheadLog, drop_torn_tail, sync_directory, write_durably
 from queryParser import SQLParser
 
+# Number of log records after which a table's row log is checkpointed into its JSON file
+LOG_COMPACT_THRESHOLD = 1000
+# Whether writes wait for their log records to be fsynced before returning
+SYNC_LOG = True
+# Budget of the in-memory table cache, measured in bytes of the tables' files on disk
+TABLE_CACHE_BYTES = 256 * 1024 * 1024
+# Budget of the query result cache, measured in bytes of the results encoded as JSON
+RESULT_CACHE_BYTES = 64 * 1024 * 1024
+# Number of parsed statements kept by the plan cache
+PLAN_CACHE_SIZE = 256
+# Worker processes of a parallel GROUP BY, and the fewest rows worth splitting across them
+AGGREGATE_WORKERS = os.cpu_count() or 1
+PARALLEL_AGGREGATE_MIN_ROWS = 100000
+
+COMPARISON_OPERATORS = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+
+def strip_quotes(value):
+    """Strip the quotes off a string literal."""
+    if isinstance(value, str) and len(value) >= 2 and value[0] in ("'", '"') and value[-1] == value[0]:
+        return value[1:-1]
+    return value
+
+
+class Placeholder:
+    """A '?' in a WHERE clause, bound to a parameter each time the statement runs."""
+
+    def __repr__(self):
+        return '?'
+
+
+PLACEHOLDER = Placeholder()
+
+
+def bind_parameters(parsed_query, params):
+    """A copy of a parsed SELECT with its placeholders replaced by params, in order."""
+    groups = parsed_query.get('condition') or []
+    count = sum(value is PLACEHOLDER for terms in groups for _, _, value in terms)
+    if count != len(params):
+        raise ValueError(f"The statement takes {count} parameters, {len(params)} given.")
+    if not count:
+        return parsed_query
+    params = iter(params)
+    condition = [[(column, operator, next(params) if value is PLACEHOLDER else value) for column, operator, value in terms]
+                 for terms in groups]
+    return {**parsed_query, 'condition': condition}
+
+
+def limit_stop(parsed_query):
+    """Number of leading result rows a query needs, offset included, or None without a LIMIT."""
+    if parsed_query.get('limit') is None:
+        return None
+    return parsed_query.get('offset', 0) + parsed_query['limit']
+
+
+class PreparedStatement:
+    """A SELECT parsed once by MyDB.prepare and run any number of times with different parameters."""
+
+    def __init__(self, db, parsed_query):
+        self.db = db
+        self.parsed_query = parsed_query
+
+    def execute(self, params=(), engine=None):
+        return self.db.execute_query(self.parsed_query, params, engine)
+
+
+def column_converter(data_type):
+    """Type conversion based on schema."""
+    if data_type == 'int':
+        return int
+    elif data_type == 'float':
+        return float
+    return strip_quotes
+
+
+def compile_term(column, operator, value, schema):
+    """Compile a single 'column operator value' comparison."""
+    if column not in schema:
+        raise ValueError(f"Column '{column}' does not exist.")
+    if operator not in COMPARISON_OPERATORS:
+        raise ValueError(f"Unsupported operator: {operator}")
+    compare = COMPARISON_OPERATORS[operator]
+
+    convert = column_converter(schema[column])
+    value = convert(value)
+
+    return lambda row: compare(convert(row[column]), value)
+
+
+def compile_groups(groups, schema):
+    """Compile a parsed condition, OR groups of AND-ed (column, operator, value) terms, into a predicate on a row."""
+    compiled_groups = [[compile_term(column, operator, value, schema) for column, operator, value in terms]
+                       for terms in groups]
+
+    if len(compiled_groups) == 1 and len(compiled_groups[0]) == 1:
+        return compiled_groups[0][0]
+    return lambda row: any(all(term(row) for term in terms) for terms in compiled_groups)
+
+
+def columnar_group_states(columns_dir, start, end, groups, schema, group_by_column, plain_columns, agg_columns):
+    """
+    Worker of the parallel GROUP BY: reads rows start to end of the columns it needs straight from a
+    columnar table's memory-mapped files and keeps those meeting the parsed condition groups. Returns,
+    per group in order of first appearance, the first row's plain columns and one aggregate state per
+    aggregated column. Only these arguments and the states cross the process boundary.
+    """
+    table = ColumnarTable(columns_dir)
+    columns = {}
+
+    def read(name):
+        if name not in columns:
+            column = table.column(name)
+            columns[name] = column[start:end] if isinstance(column, memoryview) else column.values(start, end)
+        return columns[name]
+
+    positions = range(end - start)
+    if groups:
+        matches = compile_groups(groups, schema)
+        names = list(dict.fromkeys(column for terms in groups for column, _, _ in terms))
+        rows = (dict(zip(names, values)) for values in zip(*map(read, names)))
+        positions = [i for i, row in enumerate(rows) if matches(row)]
+
+    keys = read(group_by_column)
+    grouped = {}
+    for i in positions:
+        group = grouped.get(keys[i])
+        if group is None:
+            grouped[keys[i]] = [i]
+        else:
+            group.append(i)
+
+    plain_values = [read(column) for column in plain_columns]
+    agg_values = [read(column) for column in agg_columns]
+    return {key: ([values[group[0]] for values in plain_values], [values_state([values[i] for i in group]) for values in agg_values])
+            for key, group in grouped.items()}
+
+
+def split_condition(condition, keyword):
+    """Split a condition on a boolean keyword (and/or) that is not inside a quoted literal."""
+    return re.split(rf"\s+{keyword}\s+(?=(?:[^'\"]*['\"][^'\"]*['\"])*[^'\"]*$)", condition.strip(), flags=re.IGNORECASE)
+
 class MyDB:
-    def __init__(self, metadata_file='metadata.json', data_dir='tables'):
+    def __init__(self, metadata_file='metadata.json', data_dir='tables', compact_threshold=LOG_COMPACT_THRESHOLD,
+                 table_cache_bytes=TABLE_CACHE_BYTES, engine='row', aggregate_workers=AGGREGATE_WORKERS,
+                 parallel_aggregate_min_rows=PARALLEL_AGGREGATE_MIN_ROWS, result_cache_bytes=RESULT_CACHE_BYTES,
+                 plan_cache_size=PLAN_CACHE_SIZE, sync_log=SYNC_LOG):
         self.metadata_file = metadata_file
+        self.engine = engine  # Default execution engine of query(): 'row' or 'vector'
+        self.aggregate_workers = aggregate_workers
+        self.parallel_aggregate_min_rows = parallel_aggregate_min_rows
+        self.aggregate_executor = None  # Worker processes of parallel GROUP BYs, see aggregate_pool
+        self.pool_lock = threading.Lock()
+
         self.data_dir = data_dir
+        self.compact_threshold = compact_threshold
+        self.log_counts = {}  # table name -> number of records in its row log
+        self.table_cache = LRUCache(table_cache_bytes)  # table name -> (storage signature, rows)
+        self.columnar_tables = {}  # table name -> (table signature, memory-mapped ColumnarTable)
+        self.indexes = {}  # (table name, column) -> index, loaded on first use
+        self.index_signatures = {}  # (table name, column) -> storage signature of the table its loaded index matches
+        self.result_cache = LRUCache(result_cache_bytes)  # (query, engine, table versions) -> result
+        self.table_versions = {}  # table name -> number of writes to the table by this process
+        self.parser = SQLParser()
+        self.plan_cache = LRUCache(plan_cache_size)  # statement -> parsed query, one unit of budget per entry
+        self.table_locks = TableLocks()  # Statements read a table under its read lock and write it under its write lock
+        self.metadata_lock = threading.RLock()  # Held while metadata is changed or saved
+        self.index_lock = threading.RLock()  # Guards the loaded indexes readers bring up to date
+        self.wal = WriteAheadLog(sync=sync_log)  # The tables' row logs, with group commit
         self.metadata = self.load_metadata()
+        for table_name in self.metadata:
+            self.recover_table(table_name)
 
     def load_metadata(self):
         """Load existing metadata from the file."""
@@ -18,49 +206,404 @@ class MyDB:
         else:
             return {}
     def save_metadata(self):
-        """Save the current metadata to the file."""
-        with open(self.metadata_file, 'w') as file:
-            json.dump(self.metadata, file, indent=4)
+        """Save the current metadata to the file, replacing it in one step so a crash never leaves it half-written."""
+        with self.metadata_lock:
+            write_durably(self.metadata_file + '.tmp', json.dumps(self.metadata, indent=4))
+            os.replace(self.metadata_file + '.tmp', self.metadata_file)
+            sync_directory(os.path.dirname(os.path.abspath(self.metadata_file)))
+
+    def table_file(self, table_name):
+        return os.path.join(self.data_dir, f"{table_name}.json")
+
+    def columns_dir(self, table_name):
+        return os.path.join(self.data_dir, f"{table_name}.columns")
+
+    def table_format(self, table_name):
+        """Storage format of a table's rows: 'json' (the default) or 'columnar'."""
+        return self.metadata.get(table_name, {}).get('format', 'json')
+
+    def base_file(self, table_name):
+        """The file marking the table's current snapshot, rewritten whenever the snapshot is."""
+        if self.table_format(table_name) == 'columnar':
+            return os.path.join(self.columns_dir(table_name), META_FILE)
+        return self.table_file(table_name)
+
+    def log_file(self, table_name):
+        return os.path.join(self.data_dir, f"{table_name}.jsonl")
+
+    def pending_snapshot(self, table_name):
+        """Where a checkpoint writes the table's new JSON file (or column files) before swapping it in."""
+        if self.table_format(table_name) == 'columnar':
+            return self.columns_dir(table_name) + '.tmp'
+        return self.table_file(table_name) + '.tmp'
+
+    def index_file(self, table_name, column):
+        return os.path.join(self.data_dir, f"{table_name}.{column}.idx")
+
+    def table_signature(self, table_name):
+        """Modification time and size of the table's snapshot, used to spot stale indexes."""
+        stat = os.stat(self.base_file(table_name))
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def storage_signature(self, table_name):
+        """
+        Modification times and sizes of every file backing the table.
+        A cached copy of the table is valid as long as its signature matches.
+        """
+        signature = []
+        for path in (self.base_file(table_name), self.log_file(table_name)):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def bump_table_version(self, table_name):
+        # Cached results of queries on the table are keyed by its old version and never hit again
+        self.table_versions[table_name] = self.table_versions.get(table_name, 0) + 1
+
+    def cache_table_data(self, table_name, data):
+        signature = self.storage_signature(table_name)
+        size = sum(file_signature[1] for file_signature in signature if file_signature)
+        if self.table_format(table_name) == 'columnar':
+            size = sum(os.path.getsize(os.path.join(self.columns_dir(table_name), filename))
+                       for filename in os.listdir(self.columns_dir(table_name)))
+        self.table_cache.put(table_name, (signature, data), size)
 
     def save_table_data(self, table_name, data):
-        """Save data to a table's JSON file."""
-        table_file = os.path.join(self.data_dir, f"{table_name}.json")
-        with open(table_file, 'w') as file:
-            json.dump(data, file, indent=4)
+        """
+        Checkpoint a table: save data as its new JSON file (or column files) and drop its now redundant row log.
+        The new snapshot is written and synced next to the old one, then a checkpoint record in the log marks
+        it complete before it is swapped in with os.replace. After a crash at any point, recover_table either
+        finishes the swap or keeps the old snapshot and its log.
+        """
+        pending = self.pending_snapshot(table_name)
+        if self.table_format(table_name) == 'columnar':
+            if os.path.exists(pending):
+                shutil.rmtree(pending)
+            write_table(pending, self.metadata[table_name]['schema'], data)
+        else:
+            write_durably(pending, json.dumps(data, indent=4))
+        self.wal.commit(self.wal.append(self.log_file(table_name), [{'op': 'checkpoint'}]))
+        self.install_snapshot(table_name)
+
+        self.log_counts[table_name] = 0
+        self.bump_table_version(table_name)
+        self.cache_table_data(table_name, data)  # Write-through
+        self.rebuild_indexes(table_name, data)
+
+    def install_snapshot(self, table_name):
+        """Swap a checkpoint's new snapshot in for the old one and remove the log it replaces. Safe to repeat."""
+        pending = self.pending_snapshot(table_name)
+        if self.table_format(table_name) == 'columnar':
+            # A directory cannot be replaced by another in one step, so the old one is moved aside first
+            columns_dir = self.columns_dir(table_name)
+            old_dir = columns_dir + '.old'
+            if os.path.exists(pending):
+                if os.path.exists(columns_dir):
+                    if os.path.exists(old_dir):
+                        shutil.rmtree(old_dir)
+                    os.replace(columns_dir, old_dir)
+                os.replace(pending, columns_dir)
+            if os.path.exists(old_dir):
+                shutil.rmtree(old_dir)
+        elif os.path.exists(pending):
+            os.replace(pending, self.table_file(table_name))
+        sync_directory(self.data_dir)
+
+        log_file = self.log_file(table_name)
+        self.wal.close(log_file)
+        if os.path.exists(log_file):
+            os.remove(log_file)
+
+    def recover_table(self, table_name):
+        """
+        Finish or undo a checkpoint a crash interrupted: a new snapshot the log marks complete is
+        swapped in, one that may be half-written is removed. A record the crash left half-appended to
+        the log is cut off first, so later appends start on a line of their own.
+        """
+        if os.path.exists(self.log_file(table_name)):
+            drop_torn_tail(self.log_file(table_name))
+        if self.log_checkpointed(table_name):
+            self.install_snapshot(table_name)
+            return
+        pending = self.pending_snapshot(table_name)
+        if os.path.isdir(pending):
+            shutil.rmtree(pending)
+        elif os.path.exists(pending):
+            os.remove(pending)
+
+    def log_checkpointed(self, table_name):
+        # A checkpoint record is always the last one in a log
+        log_file = self.log_file(table_name)
+        if not os.path.exists(log_file):
+            return False
+        last_line = ''
+        with open(log_file, 'r') as file:
+            for line in file:
+                if line.strip():
+                    last_line = line
+        try:
+            return json.loads(last_line).get('op') == 'checkpoint'
+        except ValueError:
+            return False
+
+    def append_to_log(self, table_name, rows):
+        """
+        Append insert records for rows to the table's write-ahead log, returning the commit ticket
+        to wait on once the table is unlocked. Each record is one line, so an insert costs a single
+        append instead of a full rewrite.
+        """
+        signature = self.storage_signature(table_name)
+        cached = self.table_cache.get(table_name)
+        cache_is_current = cached is not None and cached[0] == signature
+
+        def index_rows(index):
+            for row in rows:
+                index.add(row.get(index.column), index.row_count)
+
+        count = self.log_count(table_name)
+        ticket = self.wal.append(self.log_file(table_name), [{'op': 'insert', 'row': row} for row in rows])
+        self.bump_table_version(table_name)
+        self.maintain_indexes(table_name, signature, index_rows)
+
+        # Write-through: a cached copy that was current before the append stays current with the rows added
+        if cache_is_current:
+            cached[1].extend(rows)
+            self.cache_table_data(table_name, cached[1])
+        else:
+            self.table_cache.pop(table_name)
+
+        self.log_counts[table_name] = count + len(rows)
+        if self.log_counts[table_name] >= self.compact_threshold:
+            self.compact_table(table_name)
+        return ticket
+
+    def log_change(self, table_name, record, table_data, change_index):
+        """
+        Append an update or delete record to the table's write-ahead log. table_data is the table's rows
+        with the change made, and replaces the cached copy; change_index(index) makes the same change
+        to an index. Returns the commit ticket like append_to_log.
+        """
+        signature = self.storage_signature(table_name)
+        count = self.log_count(table_name)
+        ticket = self.wal.append(self.log_file(table_name), [record])
+        self.bump_table_version(table_name)
+        self.cache_table_data(table_name, table_data)
+        self.maintain_indexes(table_name, signature, change_index)
+
+        self.log_counts[table_name] = count + 1
+        if self.log_counts[table_name] >= self.compact_threshold:
+            self.compact_table(table_name)
+        return ticket
+
+    def log_count(self, table_name):
+        """Number of records in the table's row log, counted once per process."""
+        if table_name not in self.log_counts:
+            log_file = self.log_file(table_name)
+            count = 0
+            if os.path.exists(log_file):
+                with open(log_file, 'r') as file:
+                    count = sum(1 for line in file if line.strip())
+            self.log_counts[table_name] = count
+        return self.log_counts[table_name]
+
+    def replay_log(self, table_name, data):
+        """Apply the records of the table's row log, in order, on top of the rows loaded from its JSON file."""
+        log_file = self.log_file(table_name)
+        if not os.path.exists(log_file):
+            self.log_counts[table_name] = 0
+            return data
+
+        count = 0
+        with open(log_file, 'r') as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn last line from an interrupted append, everything before it is valid;
+                    # recover_table cuts it off when the database is opened
+                    break
+                if record['op'] == 'insert':
+                    data.append(record['row'])
+                elif record['op'] == 'update':
+                    for position in record['positions']:
+                        data[position].update(record['values'])
+                elif record['op'] == 'delete':
+                    deleted = set(record['positions'])
+                    data = [row for position, row in enumerate(data) if position not in deleted]
+                count += 1
+        self.log_counts[table_name] = count
+        return data
+
+    def compact_table(self, table_name):
+        """Checkpoint the table, folding its row log into its JSON file."""
+        table_data = self.load_table_data(table_name)
+        self.save_table_data(table_name, table_data)
+
+    def create_index(self, table_name, column, kind='hash'):
+        """Create a hash (equality) or btree (range) index on a table column."""
+        with self.table_locks.write(table_name):
+            if table_name not in self.metadata:
+                return f"Table '{table_name}' does not exist."
+            if column not in self.metadata[table_name]['schema']:
+                return f"Column '{column}' does not exist in the table."
+
+            table_data = self.load_table_data(table_name)
+            index = build_index(kind, column, table_data, self.table_signature(table_name), self.index_key(table_name, column))
+            save_index(index, self.index_file(table_name, column))
+            self.indexes[(table_name, column)] = index
+            self.index_signatures[(table_name, column)] = self.storage_signature(table_name)
+
+            with self.metadata_lock:
+                self.metadata[table_name].setdefault('indexes', {})[column] = kind
+                self.save_metadata()
+            print(f"Index on '{table_name}({column})' created successfully.")
+            return f"Index on '{table_name}({column})' created successfully."
+
+    def get_index(self, table_name, column, table_data):
+        """
+        Return the index on a table column, loading it from disk on first use.
+        Rows appended to the row log since the index was saved are indexed on the fly;
+        an index built against another version of the table file is rebuilt. A loaded index is
+        reloaded when the table's files changed in a way this process did not apply to it.
+        """
+        with self.index_lock:
+            signature = self.storage_signature(table_name)
+            index = self.indexes.get((table_name, column))
+            if index is not None and self.index_signatures.get((table_name, column)) != signature:
+                index = None  # Another process wrote to the table
+            index_file = self.index_file(table_name, column)
+            if index is None and os.path.exists(index_file):
+                index = load_index(index_file, self.index_key(table_name, column))
+
+            if index is None or index.table_signature != self.table_signature(table_name) or index.row_count > len(table_data):
+                kind = self.metadata[table_name]['indexes'][column]
+                index = build_index(kind, column, table_data, self.table_signature(table_name), self.index_key(table_name, column))
+                save_index(index, index_file)
+            else:
+                for position in range(index.row_count, len(table_data)):
+                    index.add(table_data[position].get(column), position)
+
+            self.indexes[(table_name, column)] = index
+            self.index_signatures[(table_name, column)] = signature
+            return index
+
+    def rebuild_indexes(self, table_name, table_data):
+        """Rebuild and save every index of a table after its JSON file was rewritten."""
+        for column, kind in self.metadata.get(table_name, {}).get('indexes', {}).items():
+            index = build_index(kind, column, table_data, self.table_signature(table_name), self.index_key(table_name, column))
+            save_index(index, self.index_file(table_name, column))
+            self.indexes[(table_name, column)] = index
+            self.index_signatures[(table_name, column)] = self.storage_signature(table_name)
+
+    def index_key(self, table_name, column):
+        # Index keys are converted like the row values a condition compares, so lookups match the predicate
+        return self.converter(self.metadata[table_name]['schema'][column])
+
+    def maintain_indexes(self, table_name, signature, change):
+        """
+        Apply a write just logged to the table's loaded indexes by calling change(index) on each.
+        Only indexes that matched the table before the write, whose storage signature was then
+        signature, are changed; any other is dropped and loaded again on its next use.
+        """
+        new_signature = self.storage_signature(table_name)
+        with self.index_lock:
+            for column in self.metadata.get(table_name, {}).get('indexes', {}):
+                index = self.indexes.get((table_name, column))
+                if index is None:
+                    continue
+                if self.index_signatures.get((table_name, column)) == signature:
+                    change(index)
+                    self.index_signatures[(table_name, column)] = new_signature
+                else:
+                    del self.indexes[(table_name, column)]
+
+    def remove_index_files(self, table_name, columns=None):
+        """
+        Remove the saved indexes of a table (or those on the given columns) that a logged delete or
+        update made stale. The loaded indexes are changed in place, and the files are written again
+        when the table is next checkpointed or an index is rebuilt.
+        """
+        for column in self.metadata.get(table_name, {}).get('indexes', {}):
+            if (columns is None or column in columns) and os.path.exists(self.index_file(table_name, column)):
+                os.remove(self.index_file(table_name, column))
+
+    def index_lookup(self, table_name, table_data, condition, schema):
+        """
+        Use an index to find the positions of the rows that may match the condition.
+        Returns None when no index applies; the condition must still be checked on the rows.
+        """
+        indexed_columns = self.metadata[table_name].get('indexes', {})
+        if not condition or not indexed_columns:
+            return None
+
+        groups = self.parse_condition(condition)
+        if len(groups) != 1:
+            return None  # OR conditions are scanned
+
+        # Prefer an equality term, then any range term an index can answer
+        for column, operator, value in sorted(groups[0], key=lambda term: term[1] != '='):
+            if column in indexed_columns:
+                index = self.get_index(table_name, column, table_data)
+                if operator in index.operators:
+                    return index.lookup(operator, self.compile_literal(value, schema[column]))
+        return None
 
     def create_table(self, table_name, schema):
         """Create a new table with the given schema."""
-        if table_name in self.metadata:
-            return (f"Table '{table_name}' already exists.")
+        with self.table_locks.write(table_name):
+            if table_name in self.metadata:
+                return (f"Table '{table_name}' already exists.")
 
-        # Update metadata with the new table schema
-        self.metadata[table_name] = {'schema': schema}
-        self.save_metadata()  # Save updated metadata
+            # Update metadata with the new table schema
+            with self.metadata_lock:
+                self.metadata[table_name] = {'schema': schema}
+                self.save_metadata()  # Save updated metadata
 
-        # Create an empty JSON file for the new table
-        table_file = os.path.join(self.data_dir, f"{table_name}.json")
-        with open(table_file, 'w') as file:
-            json.dump([], file)  # Initialize the table with an empty list
+            # Create an empty JSON file for the new table
+            self.save_table_data(table_name, [])  # Initialize the table with an empty list
 
-        print(f"Table '{table_name}' created successfully.")
-        return f"Table '{table_name}' created successfully."
+            print(f"Table '{table_name}' created successfully.")
+            return f"Table '{table_name}' created successfully."
 
     def insert(self, table_name, row):
         """Insert a new row into the specified table."""
-        if table_name not in self.metadata:
-            return f"Table '{table_name}' does not exist."
-
-        # Validate and convert row data based on table schema
-        table_schema = self.metadata[table_name]['schema']
-        validated_row = self.validate_and_convert_row(row, table_schema)
-
-        # Load existing data, insert the new row, and save
-        table_data = self.load_table_data(table_name)
-        table_data.append(validated_row)
-        self.save_table_data(table_name, table_data)
+        with self.table_locks.write(table_name):
+            if table_name not in self.metadata:
+                return f"Table '{table_name}' does not exist."
+
+            # Validate and convert row data based on table schema
+            table_schema = self.metadata[table_name]['schema']
+            validated_row = self.validate_and_convert_row(row, table_schema)
+            self.check_complete_rows(table_name, [validated_row])
+
+            # Append the new row to the table's row log
+            ticket = self.append_to_log(table_name, [validated_row])
+        # The log is synced with the table unlocked, so concurrent writers share an fsync (group commit)
+        self.wal.commit(ticket)
         print(f"Row inserted into '{table_name}' successfully.")
         return f"Row inserted into '{table_name}' successfully."
 
+    def insert_many(self, table_name, rows):
+        """Insert several rows into the specified table with a single write."""
+        with self.table_locks.write(table_name):
+            if table_name not in self.metadata:
+                return f"Table '{table_name}' does not exist."
+
+            # Validate every row before writing any of them
+            table_schema = self.metadata[table_name]['schema']
+            validated_rows = [self.validate_and_convert_row(row, table_schema) for row in rows]
+            self.check_complete_rows(table_name, validated_rows)
+
+            ticket = self.append_to_log(table_name, validated_rows)
+        self.wal.commit(ticket)
+        print(f"{len(validated_rows)} rows inserted into '{table_name}' successfully.")
+        return f"{len(validated_rows)} rows inserted into '{table_name}' successfully."
+
 
     def validate_and_convert_row(self, row, schema):
         """Validate and convert row data based on the schema."""
@@ -83,17 +626,28 @@ class MyDB:
         return validated_row
 
     def delete(self, table_name, condition):
-        if table_name not in self.metadata:
-            return f"Table '{table_name}' does not exist."
-
-        table_data = self.load_table_data(table_name)
-        schema = self.metadata[table_name]['schema']
-
-        # Filter out rows that match the condition
-        new_table_data = [row for row in table_data if not self.evaluate_condition(row, condition, schema)]
-
-        # Save the updated data
-        self.save_table_data(table_name, new_table_data)
+        with self.table_locks.write(table_name):
+            if table_name not in self.metadata:
+                return f"Table '{table_name}' does not exist."
+
+            table_data = self.load_table_data(table_name)
+            schema = self.metadata[table_name]['schema']
+
+            # Find the rows that match the condition
+            matches = self.compile_condition(condition, schema)
+            positions = self.index_lookup(table_name, table_data, condition, schema)
+            candidates = range(len(table_data)) if positions is None else positions
+            deleted = [position for position in candidates if matches(table_data[position])]
+
+            # Log their positions instead of rewriting the table
+            ticket = None
+            if deleted:
+                self.remove_index_files(table_name)  # The positions of the rows after them move
+                deleted_positions = set(deleted)
+                new_table_data = [row for position, row in enumerate(table_data) if position not in deleted_positions]
+                ticket = self.log_change(table_name, {'op': 'delete', 'positions': deleted}, new_table_data,
+                                         lambda index: index.delete_rows(sorted(deleted)))
+        self.wal.commit(ticket)
         print(f"Rows deleted from '{table_name}' based on condition: {condition}")
         return f"Rows deleted from '{table_name}' based on condition: {condition}"
 
@@ -103,51 +657,147 @@ class MyDB:
         updates: a dictionary of column-value pairs for the update.
         condition: a string in a simple format like "column operator value".
         """
-        if table_name not in self.metadata:
-            return Exception(f"Table '{table_name}' does not exist.")
-
-        table_data = self.load_table_data(table_name)
-        schema = self.metadata[table_name]['schema']
+        with self.table_locks.write(table_name):
+            if table_name not in self.metadata:
+                return Exception(f"Table '{table_name}' does not exist.")
+
+            table_data = self.load_table_data(table_name)
+            schema = self.metadata[table_name]['schema']
+
+            # Validate and convert updates based on schema
+            validated_updates = self.validate_and_convert_row(updates, schema)
+
+            # Find the rows that match the condition, all of which need the updated columns
+            matches = self.compile_condition(condition, schema)
+            positions = self.index_lookup(table_name, table_data, condition, schema)
+            candidates = range(len(table_data)) if positions is None else positions
+            updated = [position for position in candidates if matches(table_data[position])]
+            for position in updated:
+                for col in validated_updates:
+                    if col not in table_data[position]:
+                        return f"Column '{col}' does not exist in the table."
 
-        # Validate and convert updates based on schema
-        validated_updates = self.validate_and_convert_row(updates, schema)
+            # Update them and log their positions with the new values instead of rewriting the table
+            ticket = None
+            if updated:
+                self.remove_index_files(table_name, validated_updates)
+                old_rows = [dict(table_data[position]) for position in updated]
 
-        # Update rows that match the condition
-        for row in table_data:
-            if self.evaluate_condition(row, condition, schema):
-                for col, new_value in validated_updates.items():
-                    if col in row:
-                        row[col] = new_value
-                    else:
-                        return f"Column '{col}' does not exist in the table."
+                def update_index(index):
+                    if index.column in validated_updates:
+                        index.update_rows(updated, [row.get(index.column) for row in old_rows], validated_updates[index.column])
 
-        # Save the updated data
-        self.save_table_data(table_name, table_data)
+                for position in updated:
+                    table_data[position].update(validated_updates)
+                try:
+                    ticket = self.log_change(table_name, {'op': 'update', 'positions': updated, 'values': validated_updates}, table_data,
+                                             update_index)
+                except Exception:
+                    # The cached rows are updated but the log is not
+                    self.table_cache.pop(table_name)
+                    raise
+        self.wal.commit(ticket)
         print(f"Rows updated in '{table_name}' based on condition: {condition}")
         return f"Rows updated in '{table_name}' based on condition: {condition}"
 
 
 
-    def query(self, query_statement):
-        # Instantiate SQLParser and parse the query statement
-        parser = SQLParser()
-        parsed_query = parser.parse(query_statement)
+    def query(self, query_statement, engine=None, params=()):
+        """
+        Run a SELECT statement.
+        engine picks the execution engine for this query, 'row' or 'vector', defaulting to self.engine;
+        the vectorized NumPy engine hands anything it does not support to the row engine.
+        params are bound to the '?' placeholders of the WHERE clause, in order.
+        Results are cached until one of the tables they read is written to.
+        """
+        return self.execute_query(self.parse_query(query_statement), params, engine)
+
+    def prepare(self, query_statement):
+        """Parse a statement with '?' placeholders once, for running it with different parameters."""
+        return PreparedStatement(self, self.parse_query(query_statement))
 
+    def parse_query(self, query_statement):
+        """
+        Parse a statement, with its WHERE clause parsed into condition groups up front.
+        Parsed statements are cached, so repeated statements skip parsing.
+        """
+        parsed_query = self.plan_cache.get(query_statement)
+        if parsed_query is None:
+            parsed_query = self.parser.parse(query_statement)
+            if parsed_query.get('condition'):
+                parsed_query['condition'] = self.parse_condition(parsed_query['condition'])
+            self.plan_cache.put(query_statement, parsed_query, 1)
+        return parsed_query
+
+    def read_tables(self, parsed_query):
+        """The tables a SELECT reads: its own and the one it joins."""
+        return [parsed_query['table']] + ([parsed_query['join']['table']] if parsed_query.get('join') else [])
+
+    def execute_query(self, parsed_query, params=(), engine=None):
+        parsed_query = bind_parameters(parsed_query, params)
         if parsed_query['type'] == 'select':
-            table_data = self.load_table_data(parsed_query['table'])
-            schema = self.metadata[parsed_query['table']]['schema']
-            if 'group_by' in parsed_query and parsed_query['group_by'] is not None:
-                result = self.perform_group_by(table_data, parsed_query['group_by'], parsed_query['columns'], parsed_query.get('condition'), schema)
-            else:
-                # Handle simple SELECT queries
-                result = self.perform_select(parsed_query)
-            if 'order_by' in parsed_query:
-                result = self.sort_results(result, parsed_query['order_by'])
+            engine = engine or self.engine
+            tables = self.read_tables(parsed_query)
+            with self.table_locks.read(*tables):
+                # The storage signature catches writes by other processes, which table_versions never sees
+                cache_key = (json.dumps(parsed_query, sort_keys=True), engine,
+                             tuple((table, self.table_versions.get(table, 0), self.storage_signature(table)) for table in tables))
+                result = self.result_cache.get(cache_key)
+                if result is None:
+                    result = self.run_select(parsed_query, engine)
+                    self.result_cache.put(cache_key, result, len(json.dumps(result, default=str)))
             return result
         else:
             raise ValueError("Only SELECT queries are currently supported.")
 
-    def sort_results(self, data, order_by_clause):
+    def run_select(self, parsed_query, engine):
+        """
+        Run a parsed SELECT on the given engine.
+        With a LIMIT, ORDER BY keeps a bounded heap of the top rows, and a plain select stops scanning once it has enough.
+        """
+        stop = limit_stop(parsed_query)
+        offset = parsed_query.get('offset', 0)
+        if engine == 'vector':
+            try:
+                result = vectorized.execute_select(self, parsed_query)
+                if parsed_query.get('order_by'):
+                    result = self.sort_results(result, parsed_query['order_by'], stop)
+                return result[offset:stop]
+            except (vectorized.Unsupported, TypeError):
+                pass  # Run it on the row engine
+
+        scan_stop = stop if not parsed_query.get('order_by') and not parsed_query.get('group_by') else None
+        result = self.perform_select(parsed_query, planner.plan_select(self, parsed_query), scan_stop)
+        if 'order_by' in parsed_query:
+            result = self.sort_results(result, parsed_query['order_by'], stop)
+        return result[offset:stop]
+
+    def stream(self, query_statement, params=(), engine=None):
+        """
+        Run a SELECT and return an iterator over its rows that produces them as the row engine finds them,
+        for sending results while the query runs. ORDER BY, GROUP BY and the vectorized engine need all
+        their input first, so those queries run as in query() and are iterated afterwards.
+        Rows streamed as they are found are not cached.
+        """
+        parsed_query = bind_parameters(self.parse_query(query_statement), params)
+        if parsed_query['type'] != 'select':
+            raise ValueError("Only SELECT queries are currently supported.")
+        engine = engine or self.engine
+        if parsed_query.get('order_by') or parsed_query.get('group_by') or engine == 'vector':
+            return iter(self.execute_query(parsed_query, (), engine))
+        rows = self.stream_rows(parsed_query)
+        next(rows)  # Plan and start the scan now, so a bad query fails before anything is sent
+        return rows
+
+    def stream_rows(self, parsed_query):
+        # The tables stay read-locked until the last row is sent or the stream is dropped
+        with self.table_locks.read(*self.read_tables(parsed_query)):
+            rows = self.iter_select(parsed_query, planner.plan_select(self, parsed_query))
+            yield None
+            yield from itertools.islice(rows, parsed_query.get('offset', 0), limit_stop(parsed_query))
+
+    def sort_results(self, data, order_by_clause, limit=None):
+        """Sort the rows on the ORDER BY clause; with a limit only the first limit rows are selected, in O(limit) memory."""
         if not order_by_clause:
             return data
 
@@ -156,13 +806,48 @@ class MyDB:
         column = parts[0]
         ascending = True if len(parts) == 1 or parts[1].lower() == 'asc' else False
 
+        if limit is not None:
+            top_k = heapq.nsmallest if ascending else heapq.nlargest
+            return top_k(limit, data, key=lambda x: x[column])
         return sorted(data, key=lambda x: x[column], reverse=not ascending)
 
 
-    def perform_select(self, parsed_query):
+    def explain(self, query_statement, params=()):
+        """Describe the plan the row engine runs a SELECT with, given params for its '?' placeholders."""
+        parsed_query = self.parse_query(query_statement)
+        return planner.explain(planner.plan_select(self, bind_parameters(parsed_query, params)))
+
+    def analyze(self, table_name):
+        """Collect the row count and per-column statistics the planner estimates with."""
+        with self.table_locks.read(table_name):
+            if table_name not in self.metadata:
+                return f"Table '{table_name}' does not exist."
+            table_data = self.load_table_data(table_name)
+            stats = planner.table_statistics(table_data, self.metadata[table_name]['schema'])
+            with self.metadata_lock:
+                self.metadata[table_name]['stats'] = stats
+                self.save_metadata()
+            print(f"Table '{table_name}' analyzed: {len(table_data)} rows.")
+            return f"Table '{table_name}' analyzed: {len(table_data)} rows."
+
+    def scan_rows(self, scan):
+        """The rows a planned scan reads: the index candidates or the whole table, its condition still unchecked."""
+        table_data = self.load_table_data(scan['table'])
+        access = scan['access']
+        if access['type'] == 'index':
+            index = self.get_index(scan['table'], access['column'], table_data)
+            return [table_data[position] for position in index.lookup(access['operator'], access['value'])]
+        return table_data
+
+    def perform_select(self, parsed_query, plan, stop=None):
+        # The row generators end the scan once stop rows are selected
+        return list(itertools.islice(self.iter_select(parsed_query, plan), stop))
+
+    def iter_select(self, parsed_query, plan):
+        """Yield a planned SELECT's rows as they are produced, before ORDER BY and LIMIT."""
         # Handle JOIN
-        if parsed_query.get('join'):
-            return self.perform_join_select(parsed_query)
+        if plan['join']:
+            return self.perform_join_select(parsed_query, plan)
 
         # Handle simple and aggregate select
         table_name = parsed_query['table']
@@ -170,26 +855,38 @@ class MyDB:
         where_condition = parsed_query.get('condition', None)
         group_by_column = parsed_query.get('group_by')
 
-        table_data = self.load_table_data(table_name)
         schema = self.metadata[table_name]['schema']
+        if group_by_column and self.aggregates_in_parallel(table_name, selected_columns, schema):
+            # The workers read the table themselves
+            return iter(self.parallel_group_by(table_name, group_by_column, selected_columns, where_condition, schema))
+        table_data = self.scan_rows(plan['scans'][0])
 
         if group_by_column:
             # Handle GROUP BY with aggregates
-            return self.perform_group_by(table_data, group_by_column, selected_columns, where_condition, schema)
+            return iter(self.perform_group_by(table_data, group_by_column, selected_columns, where_condition, schema))
         else:
             # Handle simple select
             return self.perform_simple_select(table_data, selected_columns, where_condition, schema)
 
-    def perform_join_select(self, parsed_query):
-        # Simplified JOIN operation
+    def perform_join_select(self, parsed_query, plan):
+        """
+        Join two tables along a plan: the WHERE terms on a single table filter it before the join,
+        the residual filters the joined rows. Joined rows are produced as they are found, by a
+        generator returned once the tables are scanned and the conditions compiled.
+        """
         table1 = parsed_query['table']
         table2 = parsed_query['join']['table']
         join_condition = parsed_query['join']['condition']
-        where_condition = parsed_query.get('condition', None)
         selected_columns = parsed_query['columns']
 
-        table1_data = self.load_table_data(table1)
-        table2_data = self.load_table_data(table2)
+        table_data = []
+        for scan in plan['scans']:
+            rows = self.scan_rows(scan)
+            if scan['condition']:
+                matches = self.compile_condition(scan['condition'], self.metadata[scan['table']]['schema'])
+                rows = [row for row in rows if matches(row)]
+            table_data.append(rows)
+        table1_data, table2_data = table_data
         table1_schema = self.metadata[table1]['schema']
         table2_schema = self.metadata[table2]['schema']
 
@@ -197,16 +894,57 @@ class MyDB:
         combined_schema = {f"{table1}.{k}": v for k, v in table1_schema.items()}
         combined_schema.update({f"{table2}.{k}": v for k, v in table2_schema.items()})
 
-        joined_data = []
-        for row1 in table1_data:
-            for row2 in table2_data:
-                if self.evaluate_join_condition(row1, row2, join_condition):
-                    combined_row = self.combine_rows(row1, row2, table1, table2)
-                    if not where_condition or self.evaluate_condition(combined_row, where_condition, combined_schema):
-                        selected_row = self.select_columns(combined_row, selected_columns, table1, table2)
-                        joined_data.append(selected_row)
+        matches = self.compile_condition(plan['residual'], combined_schema) if plan['residual'] else None
+
+        combined_rows = (self.combine_rows(row1, row2, table1, table2)
+                         for row1, row2 in self.join_rows(table1_data, table2_data, table1, table2, join_condition, plan['join']['build']))
+        return (self.select_columns(combined_row, selected_columns, table1, table2)
+                for combined_row in combined_rows if not matches or matches(combined_row))
+
+    def join_rows(self, table1_data, table2_data, table1, table2, join_condition, build_table=None):
+        """
+        Yield the (row1, row2) pairs that satisfy the join condition.
+        Equi-joins build a dict on the join column of build_table, or of the smaller table,
+        and probe it with the other; any other condition falls back to a nested loop.
+        """
+        join_columns = self.parse_join_condition(join_condition, table1, table2)
+        if join_columns is None:
+            for row1 in table1_data:
+                for row2 in table2_data:
+                    if self.evaluate_join_condition(row1, row2, join_condition):
+                        yield row1, row2
+            return
+
+        column1, column2 = join_columns
+        if build_table == table1 or build_table is None and len(table1_data) <= len(table2_data):
+            build_data, build_column, probe_data, probe_column, build_is_table1 = table1_data, column1, table2_data, column2, True
+        else:
+            build_data, build_column, probe_data, probe_column, build_is_table1 = table2_data, column2, table1_data, column1, False
 
-        return joined_data
+        hash_table = {}
+        for row in build_data:
+            if build_column in row:
+                hash_table.setdefault(row[build_column], []).append(row)
+
+        for probe_row in probe_data:
+            for build_row in hash_table.get(probe_row.get(probe_column), ()):
+                yield (build_row, probe_row) if build_is_table1 else (probe_row, build_row)
+
+    def parse_join_condition(self, condition, table1, table2):
+        """
+        Parse a "table1.column = table2.column" condition once per query.
+        Returns the (table1 column, table2 column) pair, or None if it is not an equi-join.
+        """
+        match = re.fullmatch(r"\s*(\w+)\.(\w+)\s*=\s*(\w+)\.(\w+)\s*", condition)
+        if not match:
+            return None
+
+        left_table, left_column, right_table, right_column = match.groups()
+        if (left_table, right_table) == (table1, table2):
+            return left_column, right_column
+        elif (left_table, right_table) == (table2, table1):
+            return right_column, left_column
+        return None
 
     # def simple_select(self, parsed_query):
     #     """
@@ -269,14 +1007,14 @@ class MyDB:
         Select specified columns from a row.
         """
         if len(columns) == 1 and columns[0].get('column') == '*':
-            return row
+            return dict(row)  # The row itself belongs to the table cache
 
         selected_row = {}
         for col in columns:
             if col.get('column') in row:
                 selected_row[col.get('column')] = row[col.get('column')]
             elif col.get('column') == '*':
-                return row
+                return dict(row)
             # You can add more logic here if you want to handle aggregates in a simple select
 
         return selected_row
@@ -294,63 +1032,139 @@ class MyDB:
     #         return [row for row in reader]
 
     def load_table_data(self, table_name):
-        """Load data from a table's JSON file."""
-        table_file = os.path.join(self.data_dir, f"{table_name}.json")
+        """
+        Load data from a table's JSON file (or column files) and replay its row log.
+        Tables are served from the table cache while their files are unchanged.
+        """
+        cached = self.table_cache.get(table_name)
+        if cached is not None and cached[0] == self.storage_signature(table_name):
+            return cached[1]
+
+        table_file = self.base_file(table_name)
         if not os.path.exists(table_file):
             raise Exception(f"No data found for table '{table_name}'.")
 
-        with open(table_file, 'r') as file:
-            return json.load(file)
+        if self.table_format(table_name) == 'columnar':
+            table_data = self.load_columnar_table(table_name).rows()
+        else:
+            with open(table_file, 'r') as file:
+                table_data = json.load(file)
+        table_data = self.replay_log(table_name, table_data)
+        self.cache_table_data(table_name, table_data)
+        return table_data
+
+    def load_columnar_table(self, table_name):
+        """The memory-mapped column files of a columnar table, reopened when they are rewritten."""
+        signature = self.table_signature(table_name)
+        cached = self.columnar_tables.get(table_name)
+        if cached is None or cached[0] != signature:
+            cached = (signature, ColumnarTable(self.columns_dir(table_name)))
+            self.columnar_tables[table_name] = cached
+        return cached[1]
+
+    def load_column(self, table_name, column):
+        """
+        Load a single column of a table.
+        Columnar tables without logged changes return a zero-copy view of the memory-mapped column
+        file; otherwise the column's values are collected into a list.
+        """
+        if self.table_format(table_name) == 'columnar' and not os.path.exists(self.log_file(table_name)):
+            return self.load_columnar_table(table_name).column(column)
+        return [row.get(column) for row in self.load_table_data(table_name)]
+
+    def convert_table(self, table_name, storage_format):
+        """Convert a table between the 'json' and 'columnar' storage formats."""
+        with self.table_locks.write(table_name):
+            if table_name not in self.metadata:
+                return f"Table '{table_name}' does not exist."
+            if storage_format not in ('json', 'columnar'):
+                raise ValueError(f"Unsupported storage format: {storage_format}")
+
+            old_format = self.table_format(table_name)
+            if old_format == storage_format:
+                return f"Table '{table_name}' is already stored as {storage_format}."
+
+            table_data = self.load_table_data(table_name)
+            # Until the new format is in the saved metadata the old files are the table, so its log goes into them first
+            if self.log_count(table_name):
+                self.save_table_data(table_name, table_data)
+            with self.metadata_lock:
+                self.metadata[table_name]['format'] = storage_format
+            try:
+                self.save_table_data(table_name, table_data)
+            except ValueError:
+                # Rows without every column cannot be stored as columns
+                if os.path.isdir(self.pending_snapshot(table_name)):
+                    shutil.rmtree(self.pending_snapshot(table_name))
+                with self.metadata_lock:
+                    self.metadata[table_name]['format'] = old_format
+                raise
+            with self.metadata_lock:
+                if storage_format == 'json':
+                    del self.metadata[table_name]['format']
+                self.save_metadata()
+
+            # Remove the files of the old format
+            if old_format == 'columnar':
+                shutil.rmtree(self.columns_dir(table_name))
+                self.columnar_tables.pop(table_name, None)
+            else:
+                os.remove(self.table_file(table_name))
+
+            print(f"Table '{table_name}' converted to {storage_format}.")
+            return f"Table '{table_name}' converted to {storage_format}."
+
+    def check_complete_rows(self, table_name, rows):
+        # The columnar format has no nulls, so its rows need every column
+        if self.table_format(table_name) == 'columnar':
+            for row in rows:
+                for col in self.metadata[table_name]['schema']:
+                    if col not in row:
+                        raise ValueError(f"Missing value for column '{col}' in columnar table '{table_name}'.")
 
-    def evaluate_condition(self, row_data, condition, schema):
+    def parse_condition(self, condition):
         """
-        Evaluates the condition against a row of data.
-        Support conditions in various formats, e.g., 'column = value', 'column=value'.
+        Parse a condition into a list of OR groups, each a list of (column, operator, value) terms.
+        e.g. "age > 20 and name = 'Bill' or id = 1" -> [[('age', '>', '20'), ('name', '=', 'Bill')], [('id', '=', '1')]]
+        An unquoted ? parses to PLACEHOLDER; conditions that are already parsed are returned as they are.
         """
-        # Regular expression to parse the condition
-        match = re.match(r"(.*?)\s*([=><])\s*(.*)", condition)
-        if not match:
-            raise ValueError("Invalid condition format.")
-
-        column, operator, value = match.groups()
-
-        # Strip quotes if the value is a string literal
-        if (value.startswith("'") and value.endswith("'")) or \
-           (value.startswith('"') and value.endswith('"')):
-            value = value[1:-1]
-
-
-        # Fetch the actual value from the row data
-        actual_value = row_data[column]
-        if (isinstance(actual_value, str)):
-            if (actual_value.startswith("'") and actual_value.endswith("'")) or \
-               (actual_value.startswith('"') and actual_value.endswith('"')):
-                actual_value = actual_value[1:-1]
-
-        # Type conversion based on schema
-        if schema[column] == 'int':
-            actual_value = int(actual_value)
-            value = int(value)
-        elif schema[column] == 'float':
-            actual_value = float(actual_value)
-            value = float(value)
-
-        # Evaluate the condition
-        if operator == '=':
-            return actual_value == value
-        elif operator == '>':
-            return actual_value > value
-        elif operator == '<':
-            return actual_value < value
-        else:
-            raise ValueError(f"Unsupported operator: {operator}")
+        if not isinstance(condition, str):
+            return condition
+        groups = []
+        for or_part in split_condition(condition, 'or'):
+            terms = []
+            for term in split_condition(or_part, 'and'):
+                match = re.match(r"(.*?)\s*(<=|>=|!=|=|>|<)\s*(.*)", term.strip())
+                if not match:
+                    raise ValueError("Invalid condition format.")
+                column, operator, value = match.groups()
+                value = value.strip()
+                terms.append((column, operator, PLACEHOLDER if value == '?' else strip_quotes(value)))
+            groups.append(terms)
+        return groups
+
+    def compile_condition(self, condition, schema):
+        """
+        Compile a condition into a predicate on a row, once per query.
+        The condition is parsed and its literals converted to the column types up front,
+        so checking a row is a dict lookup and a comparison.
+        """
+        return compile_groups(self.parse_condition(condition), schema)
+
+    def converter(self, data_type):
+        """Type conversion based on schema."""
+        return column_converter(data_type)
 
+    def compile_literal(self, value, data_type):
+        return self.converter(data_type)(value)
 
     def perform_group_by(self, table_data, group_by_column, selected_columns, where_condition, schema):
         # Group data and apply aggregate functions
+        matches = self.compile_condition(where_condition, schema) if where_condition else None
+
         grouped_data = {}
         for row in table_data:
-            if where_condition and not self.evaluate_condition(row, where_condition, schema):
+            if matches and not matches(row):
                 continue
 
             key = row[group_by_column]
@@ -361,18 +1175,92 @@ class MyDB:
 
         return self.apply_aggregates(grouped_data, selected_columns, group_by_column)
 
-    def apply_aggregates(self, grouped_data, selected_columns, group_by_column):
-        # Apply aggregate functions on grouped data
+    def aggregates_in_parallel(self, table_name, selected_columns, schema):
+        """
+        Whether a GROUP BY runs in worker processes: the table has to be columnar with no logged
+        changes, so each worker can read its own range of rows from the column files, and large
+        enough to be worth splitting.
+        """
+        if self.aggregate_workers <= 1 or self.table_format(table_name) != 'columnar' or os.path.exists(self.log_file(table_name)):
+            return False
+        if self.load_columnar_table(table_name).row_count < self.parallel_aggregate_min_rows:
+            return False
+        # Aggregate states only reproduce the serial results on numeric columns
+        return all(col_info.get('function', '').lower() == 'count' or schema.get(col_info['column']) in ('int', 'float')
+                   for col_info in selected_columns if 'function' in col_info)
+
+    def aggregate_pool(self):
+        """
+        The worker processes of parallel GROUP BYs, started on first use and kept for later queries.
+        Workers come from a forkserver, not a fork of this process, whose other threads may hold locks.
+        """
+        with self.pool_lock:
+            if self.aggregate_executor is None:
+                context = multiprocessing.get_context('forkserver')
+                context.set_forkserver_preload(['db'])
+                self.aggregate_executor = ProcessPoolExecutor(max_workers=self.aggregate_workers, mp_context=context)
+            return self.aggregate_executor
+
+    def parallel_group_by(self, table_name, group_by_column, selected_columns, where_condition, schema):
+        """
+        Two-phase GROUP BY on a columnar table: each worker process reads one range of rows from the
+        column files and computes partial aggregate states, which are merged here in range order.
+        """
+        plain_columns = [col_info['column'] for col_info in selected_columns if 'function' not in col_info]
+        agg_columns = list(dict.fromkeys(col_info['column'] for col_info in selected_columns if 'function' in col_info))
+        groups = self.parse_condition(where_condition) if where_condition else []
+        compile_groups(groups, schema)  # A bad condition fails here rather than in every worker
+
+        row_count = self.load_columnar_table(table_name).row_count
+        range_size = max(-(-row_count // self.aggregate_workers), 1)
+        starts = list(range(0, row_count, range_size))
+        ends = [min(start + range_size, row_count) for start in starts]
+        count = len(starts)
+        grouped = {}
+        parts = self.aggregate_pool().map(columnar_group_states, [self.columns_dir(table_name)] * count, starts, ends,
+                                          [groups] * count, [schema] * count, [group_by_column] * count,
+                                          [plain_columns] * count, [agg_columns] * count)
+        for part in parts:
+            for key, (plain_values, states) in part.items():
+                if key in grouped:
+                    for state, other in zip(grouped[key][1], states):
+                        merge_states(state, other)
+                else:
+                    grouped[key] = (plain_values, states)
+
         aggregated_data = []
-        for key, rows in grouped_data.items():
+        for key, (plain_values, states) in grouped.items():
             aggregated_row = {group_by_column: key}
+            plain_values = dict(zip(plain_columns, plain_values))
             for col_info in selected_columns:
+                column = col_info['column']
                 if 'function' in col_info:
-                    col_name = col_info['column']
                     function = col_info['function'].lower()
-                    aggregated_row[f"{function}({col_name})"] = self.apply_aggregate_function(rows, col_info)
+                    aggregated_row[f"{function}({column})"] = finalize(function, states[agg_columns.index(column)])
                 else:
-                    aggregated_row[col_info['column']] = rows[0][col_info['column']]
+                    aggregated_row[column] = plain_values[column]
+            aggregated_data.append(aggregated_row)
+        return aggregated_data
+
+    def apply_aggregates(self, grouped_data, selected_columns, group_by_column):
+        # Apply aggregate functions on grouped data
+        aggregated_data = []
+        # Resolve the output name and function of each selected column once
+        outputs = []
+        for col_info in selected_columns:
+            if 'function' in col_info:
+                function = col_info['function'].lower()
+                outputs.append((f"{function}({col_info['column']})", col_info['column'], function))
+            else:
+                outputs.append((col_info['column'], col_info['column'], None))
+
+        for key, rows in grouped_data.items():
+            aggregated_row = {group_by_column: key}
+            for output_name, column, function in outputs:
+                if function:
+                    aggregated_row[output_name] = self.apply_aggregate_function(rows, {'column': column, 'function': function})
+                else:
+                    aggregated_row[output_name] = rows[0][column]
             aggregated_data.append(aggregated_row)
 
         return aggregated_data
@@ -380,25 +1268,27 @@ class MyDB:
     def apply_aggregate_function(self, rows, col_info):
         # Apply the specified aggregate function
         column = col_info['column']
-        values = [row[column] for row in rows]
+        function = col_info['function'].lower()
 
-        if col_info['function'].lower() == 'count':
-            return len(values)
-        elif col_info['function'].lower() == 'sum':
+        if function == 'count':
+            return len(rows)
+
+        values = [row[column] for row in rows]
+        if function == 'sum':
             return sum(values)
-        elif col_info['function'].lower() == 'avg':
+        elif function == 'avg':
             return sum(values) / len(values) if values else 0
+        elif function == 'min':
+            return min(values) if values else None
+        elif function == 'max':
+            return max(values) if values else None
         # Add more aggregate functions as needed
         else:
             raise ValueError(f"Unsupported aggregate function: {col_info['function']}")
 
     def perform_simple_select(self, table_data, selected_columns, where_condition, schema):
-        # Perform a simple select operation
-        filtered_data = []
-        for row in table_data:
-            if not where_condition or self.evaluate_condition(row, where_condition, schema):
-                filtered_row = self.select_columns_simple(row, selected_columns)
-                filtered_data.append(filtered_row)
-
-        return filtered_data
+        # Perform a simple select operation, returning a generator of the selected rows as the scan finds them.
+        # The condition is compiled before the generator is returned, so a bad one fails before any row is sent
+        matches = self.compile_condition(where_condition, schema) if where_condition else None
+        return (self.select_columns_simple(row, selected_columns) for row in table_data if not matches or matches(row))
 
@@ -0,0 +1,174 @@
+import bisect
+import json
+
+# Version of the saved index files; files of another version are rebuilt
+INDEX_FORMAT = 2
+
+
+class HashIndex:
+    """
+    Maps each value of a column to the positions of the rows holding it.
+    Answers equality lookups only. Values are stored as key(value), so key must normalize them
+    the way lookup values are.
+    """
+    kind = 'hash'
+    operators = ('=',)
+
+    def __init__(self, column, row_count=0, table_signature=None, key=None):
+        self.column = column
+        self.row_count = row_count  # Number of table rows covered by the index
+        self.table_signature = table_signature  # Table file the index was built against
+        self.key = key or (lambda value: value)
+        self.entries = {}
+
+    def add(self, value, position):
+        if value is not None:
+            self.entries.setdefault(self.key(value), []).append(position)
+        self.row_count = max(self.row_count, position + 1)
+
+    def lookup(self, operator, value):
+        """Positions of the rows matching 'column operator value', in table order."""
+        if operator != '=':
+            raise ValueError(f"A {self.kind} index does not support '{operator}'.")
+        return self.entries.get(value, [])
+
+    def delete_rows(self, deleted):
+        """Forget the rows at the sorted positions deleted; the rows after each move up one position."""
+        deleted_positions = set(deleted)
+        for value in list(self.entries):
+            positions = [position - bisect.bisect_left(deleted, position) for position in self.entries[value]
+                         if position not in deleted_positions]
+            if positions:
+                self.entries[value] = positions
+            else:
+                del self.entries[value]
+        self.row_count -= len(deleted)
+
+    def update_rows(self, positions, old_values, value):
+        """Move the rows at positions, which held old_values, to value."""
+        for position, old_value in zip(positions, old_values):
+            if old_value is not None:
+                entry = self.entries[self.key(old_value)]
+                entry.remove(position)
+                if not entry:
+                    del self.entries[self.key(old_value)]
+            if value is not None:
+                bisect.insort(self.entries.setdefault(self.key(value), []), position)
+
+    def to_json(self):
+        return {'row_count': self.row_count, 'table_signature': self.table_signature,
+                'entries': [[value, positions] for value, positions in self.entries.items()]}
+
+    def load_entries(self, data):
+        for value, positions in data['entries']:
+            self.entries[value] = positions
+
+
+class SortedIndex:
+    """
+    Keeps (value, position) pairs sorted by value.
+    Answers equality and range lookups with a binary search. Values are stored as key(value).
+    """
+    kind = 'btree'
+    operators = ('=', '<', '<=', '>', '>=')
+
+    def __init__(self, column, row_count=0, table_signature=None, key=None):
+        self.column = column
+        self.row_count = row_count
+        self.table_signature = table_signature
+        self.key = key or (lambda value: value)
+        self.keys = []
+        self.positions = []
+
+    def add(self, value, position):
+        if value is not None:
+            value = self.key(value)
+            # Rows are appended in position order, so equal keys stay in table order
+            i = bisect.bisect_right(self.keys, value)
+            self.keys.insert(i, value)
+            self.positions.insert(i, position)
+        self.row_count = max(self.row_count, position + 1)
+
+    def lookup(self, operator, value):
+        """Positions of the rows matching 'column operator value', in table order."""
+        if operator == '=':
+            start, end = bisect.bisect_left(self.keys, value), bisect.bisect_right(self.keys, value)
+        elif operator == '<':
+            start, end = 0, bisect.bisect_left(self.keys, value)
+        elif operator == '<=':
+            start, end = 0, bisect.bisect_right(self.keys, value)
+        elif operator == '>':
+            start, end = bisect.bisect_right(self.keys, value), len(self.keys)
+        elif operator == '>=':
+            start, end = bisect.bisect_left(self.keys, value), len(self.keys)
+        else:
+            raise ValueError(f"A {self.kind} index does not support '{operator}'.")
+        return sorted(self.positions[start:end])
+
+    def delete_rows(self, deleted):
+        """Forget the rows at the sorted positions deleted; the rows after each move up one position."""
+        deleted_positions = set(deleted)
+        pairs = [(value, position - bisect.bisect_left(deleted, position)) for value, position in zip(self.keys, self.positions)
+                 if position not in deleted_positions]
+        self.keys = [value for value, _ in pairs]
+        self.positions = [position for _, position in pairs]
+        self.row_count -= len(deleted)
+
+    def update_rows(self, positions, old_values, value):
+        """Move the rows at positions, which held old_values, to value."""
+        for position, old_value in zip(positions, old_values):
+            if old_value is not None:
+                old_key = self.key(old_value)
+                start = bisect.bisect_left(self.keys, old_key)
+                i = start + self.positions[start:bisect.bisect_right(self.keys, old_key)].index(position)
+                del self.keys[i]
+                del self.positions[i]
+            self.add(value, position)
+
+    def to_json(self):
+        return {'row_count': self.row_count, 'table_signature': self.table_signature,
+                'keys': self.keys, 'positions': self.positions}
+
+    def load_entries(self, data):
+        self.keys = data['keys']
+        self.positions = data['positions']
+
+
+INDEX_TYPES = {index_type.kind: index_type for index_type in (HashIndex, SortedIndex)}
+
+
+def build_index(kind, column, table_data, table_signature=None, key=None):
+    """
+    Build an index of the given kind over a column of the table's rows. key normalizes the
+    values, as the literals of the conditions the index answers are normalized.
+    """
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unsupported index type: {kind}")
+    index = INDEX_TYPES[kind](column, table_signature=table_signature, key=key)
+    if kind == 'btree':
+        # Sort once instead of inserting row by row
+        pairs = sorted(((index.key(row[column]), position) for position, row in enumerate(table_data) if row.get(column) is not None),
+                       key=lambda pair: pair[0])
+        index.keys = [value for value, _ in pairs]
+        index.positions = [position for _, position in pairs]
+    else:
+        for position, row in enumerate(table_data):
+            index.add(row.get(column), position)
+    index.row_count = len(table_data)
+    return index
+
+
+def save_index(index, index_file):
+    with open(index_file, 'w') as file:
+        json.dump({'format': INDEX_FORMAT, 'kind': index.kind, 'column': index.column, **index.to_json()}, file)
+
+
+def load_index(index_file, key=None):
+    """Load a saved index, or return None if it was saved by another version."""
+    with open(index_file, 'r') as file:
+        data = json.load(file)
+    if data.get('format') != INDEX_FORMAT:
+        return None
+    index = INDEX_TYPES[data['kind']](data['column'], data['row_count'], data['table_signature'], key)
+    index.load_entries(data)
+    return index
@@ -0,0 +1,81 @@
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """
+    Any number of readers or a single writer. A waiting writer holds off new readers,
+    so a steady stream of queries cannot starve writes. Not reentrant.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.readers = 0
+        self.writer = False
+        self.waiting_writers = 0
+
+    def acquire_read(self):
+        with self.condition:
+            while self.writer or self.waiting_writers:
+                self.condition.wait()
+            self.readers += 1
+
+    def release_read(self):
+        with self.condition:
+            self.readers -= 1
+            if not self.readers:
+                self.condition.notify_all()
+
+    def acquire_write(self):
+        with self.condition:
+            self.waiting_writers += 1
+            while self.writer or self.readers:
+                self.condition.wait()
+            self.waiting_writers -= 1
+            self.writer = True
+
+    def release_write(self):
+        with self.condition:
+            self.writer = False
+            self.condition.notify_all()
+
+
+class TableLocks:
+    """
+    One ReadWriteLock per table name, created on first use.
+    Locks on several tables are always taken in name order, so two statements cannot deadlock.
+    """
+
+    def __init__(self):
+        self.locks = {}
+        self.mutex = threading.Lock()
+
+    def lock(self, table_name):
+        with self.mutex:
+            return self.locks.setdefault(table_name, ReadWriteLock())
+
+    @contextmanager
+    def read(self, *table_names):
+        locks = [self.lock(table_name) for table_name in sorted(set(table_names))]
+        acquired = []
+        try:
+            for lock in locks:
+                lock.acquire_read()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release_read()
+
+    @contextmanager
+    def write(self, *table_names):
+        locks = [self.lock(table_name) for table_name in sorted(set(table_names))]
+        acquired = []
+        try:
+            for lock in locks:
+                lock.acquire_write()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release_write()
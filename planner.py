@@ -0,0 +1,203 @@
+"""
+Cost-based planning of MyDB SELECTs.
+
+ANALYZE stores per-table statistics in metadata.json: the row count, and the number of distinct
+values, minimum and maximum of each column. The planner uses them to estimate how many rows each
+condition keeps, which decides whether an index beats a scan and which side of a join to build
+the hash table on. WHERE terms on one table of a join are pushed below the join.
+"""
+from indexes import INDEX_TYPES
+
+# Fractions of rows a term keeps when the column has no statistics
+DEFAULT_SELECTIVITY = {'=': 0.1, '!=': 0.9, 'range': 1 / 3}
+# An index lookup beats a scan when it is expected to keep at most this fraction of the rows
+INDEX_SELECTIVITY_LIMIT = 0.3
+
+
+def table_statistics(table_data, schema):
+    """The statistics ANALYZE stores for a table."""
+    columns = {}
+    for column in schema:
+        values = [row[column] for row in table_data if row.get(column) is not None]
+        column_stats = {'distinct': len(set(values)), 'min': None, 'max': None}
+        try:
+            if values:
+                column_stats['min'], column_stats['max'] = min(values), max(values)
+        except TypeError:
+            pass  # Values of mixed types have no order
+        columns[column] = column_stats
+    return {'row_count': len(table_data), 'columns': columns}
+
+
+def term_selectivity(stats, column, operator, value):
+    """Estimated fraction of rows for which 'column operator value' holds."""
+    column_stats = stats['columns'].get(column) if stats else None
+    if operator in ('=', '!='):
+        if column_stats is None:
+            return DEFAULT_SELECTIVITY[operator]
+        equal = 1 / column_stats['distinct'] if column_stats['distinct'] else 0
+        return equal if operator == '=' else 1 - equal
+
+    if column_stats is None:
+        return DEFAULT_SELECTIVITY['range']
+    low, high = column_stats['min'], column_stats['max']
+    try:
+        # Assume values are spread evenly between the minimum and the maximum
+        below = (value - low) / (high - low) if high > low else float(value > low)
+    except TypeError:
+        return DEFAULT_SELECTIVITY['range']
+    below = min(max(below, 0.0), 1.0)
+    return below if operator in ('<', '<=') else 1 - below
+
+
+def condition_selectivity(stats, groups):
+    """Estimated fraction of rows matching OR groups of AND-ed terms, taking terms as independent."""
+    if not groups:
+        return 1.0
+    misses = 1.0
+    for terms in groups:
+        matches = 1.0
+        for column, operator, value in terms:
+            matches *= term_selectivity(stats, column, operator, value)
+        misses *= 1 - matches
+    return 1 - misses
+
+
+def split_join_condition(groups, table1, table2):
+    """
+    Split a join's WHERE groups into the conditions that can be pushed down to each table,
+    with unprefixed column names, and the residual checked on the joined rows.
+    """
+    pushed = {table1: [], table2: []}
+    if not groups:
+        return pushed, []
+
+    def table_of(column):
+        prefix, _, name = column.partition('.')
+        return (prefix, name) if name and prefix in pushed else (None, column)
+
+    if len(groups) == 1:
+        # A conjunction: every term on a single table moves below the join
+        residual = []
+        for column, operator, value in groups[0]:
+            table, name = table_of(column)
+            if table is None:
+                residual.append((column, operator, value))
+            else:
+                pushed[table].append((name, operator, value))
+        return {table: [terms] if terms else [] for table, terms in pushed.items()}, [residual] if residual else []
+
+    # A disjunction can only move down as a whole, when all of it is on one table
+    tables = {table_of(column)[0] for terms in groups for column, _, _ in terms}
+    if len(tables) == 1 and None not in tables:
+        table = tables.pop()
+        pushed[table] = [[(table_of(column)[1], operator, value) for column, operator, value in terms] for terms in groups]
+        return pushed, []
+    return pushed, groups
+
+
+def choose_access(db, table_name, groups, stats):
+    """Scan the table, or look up the most selective term an index can answer."""
+    indexed_columns = db.metadata[table_name].get('indexes', {})
+    if len(groups) != 1 or not indexed_columns:
+        return {'type': 'scan'}
+
+    schema = db.metadata[table_name]['schema']
+    best = None
+    for column, operator, value in groups[0]:
+        kind = indexed_columns.get(column)
+        if kind is None or operator not in INDEX_TYPES[kind].operators:
+            continue
+        literal = db.compile_literal(value, schema[column])
+        selectivity = term_selectivity(stats, column, operator, literal)
+        if best is None or selectivity < best['selectivity']:
+            best = {'type': 'index', 'kind': kind, 'column': column, 'operator': operator, 'value': literal,
+                    'selectivity': selectivity}
+    # Without statistics an applicable index is always used
+    if best is None or (stats and best['selectivity'] > INDEX_SELECTIVITY_LIMIT):
+        return {'type': 'scan'}
+    return best
+
+
+def plan_scan(db, table_name, groups):
+    stats = db.metadata[table_name].get('stats')
+    scan = {'table': table_name, 'condition': groups, 'access': choose_access(db, table_name, groups, stats),
+            'estimated_rows': None}
+    if stats:
+        # Estimates compare the literals in the column types
+        schema = db.metadata[table_name]['schema']
+        typed_groups = [[(column, operator, db.compile_literal(value, schema[column]) if column in schema else value)
+                         for column, operator, value in terms] for terms in groups]
+        scan['estimated_rows'] = round(stats['row_count'] * condition_selectivity(stats, typed_groups))
+    return scan
+
+
+def plan_select(db, parsed_query):
+    """
+    Plan a parsed SELECT whose condition is already parsed into groups.
+    Returns the scan of each table, and for joins the join algorithm, its build side and the residual condition.
+    """
+    table1 = parsed_query['table']
+    groups = parsed_query.get('condition') or []
+    plan = {'scans': [], 'join': None, 'residual': [], 'group_by': parsed_query.get('group_by'),
+            'order_by': parsed_query.get('order_by'), 'limit': parsed_query.get('limit'), 'offset': parsed_query.get('offset', 0)}
+
+    if not parsed_query.get('join') or parsed_query.get('group_by'):
+        # GROUP BY runs on the first table alone
+        plan['scans'].append(plan_scan(db, table1, groups))
+        return plan
+
+    table2 = parsed_query['join']['table']
+    pushed, plan['residual'] = split_join_condition(groups, table1, table2)
+    scan1, scan2 = plan_scan(db, table1, pushed[table1]), plan_scan(db, table2, pushed[table2])
+    plan['scans'] = [scan1, scan2]
+
+    condition = parsed_query['join']['condition']
+    join = {'condition': condition, 'algorithm': 'nested_loop', 'build': None}
+    if db.parse_join_condition(condition, table1, table2) is not None:
+        join['algorithm'] = 'hash'
+        # Build on the side expected to be smaller; without estimates the executor compares the actual rows
+        if scan1['estimated_rows'] is not None and scan2['estimated_rows'] is not None:
+            join['build'] = table1 if scan1['estimated_rows'] <= scan2['estimated_rows'] else table2
+    plan['join'] = join
+    return plan
+
+
+def format_condition(groups):
+    return ' or '.join(' and '.join(f"{column} {operator} {value!r}" for column, operator, value in terms) for terms in groups)
+
+
+def explain(plan):
+    """Describe a plan, one step per line."""
+    lines = []
+    for scan in plan['scans']:
+        access = scan['access']
+        if access['type'] == 'index':
+            line = f"Index lookup on {scan['table']} using {access['kind']} index on {access['column']} ({access['column']} {access['operator']} {access['value']!r})"
+        else:
+            line = f"Full scan of {scan['table']}"
+        if scan['condition']:
+            line += f", filter: {format_condition(scan['condition'])}"
+        if scan['estimated_rows'] is not None:
+            line += f" (~{scan['estimated_rows']} rows)"
+        lines.append(line)
+
+    join = plan['join']
+    if join:
+        if join['algorithm'] == 'hash':
+            build = f"build on {join['build']}" if join['build'] else "build on the smaller input"
+            lines.append(f"Hash join on {join['condition']}, {build}")
+        else:
+            lines.append(f"Nested loop join on {join['condition']}")
+        if plan['residual']:
+            lines.append(f"Filter: {format_condition(plan['residual'])}")
+    if plan['group_by']:
+        lines.append(f"Group by {plan['group_by']}")
+    if plan['order_by']:
+        if plan['limit'] is not None:
+            lines.append(f"Top {plan['offset'] + plan['limit']} by {plan['order_by']} (bounded heap)")
+        else:
+            lines.append(f"Sort by {plan['order_by']}")
+    if plan['limit'] is not None:
+        lines.append(f"Limit {plan['limit']}" + (f" offset {plan['offset']}" if plan['offset'] else ""))
+    return '\n'.join(lines)
@@ -1,5 +1,17 @@
 import re
 
+# Compiled once, parse_select matches every SELECT against it
+SELECT_PATTERN = re.compile(r"""
+    select\s+(.*?)\s+from\s+(\w+)           # Select and From clauses
+    (?:\s+join\s+(\w+)\s+on\s+(.*?))?       # Optional JOIN clause
+    (?:\s+where\s+(.*?))?                   # Optional WHERE clause
+    (?:\s+group\s+by\s+(.*?))?              # Optional GROUP BY clause
+    (?:\s+order\s+by\s+(.*?))?              # Optional ORDER BY clause
+    (?:\s+limit\s+(\d+)(?:\s+offset\s+(\d+))?)?  # Optional LIMIT and OFFSET
+    $                                       # End of string
+""", re.IGNORECASE | re.VERBOSE)
+AGGREGATE_PATTERN = re.compile(r"(\w+)\((\w+)\)")
+
 class SQLParser:
     def parse(self, query):
         query = query.strip()
@@ -10,20 +22,11 @@ class SQLParser:
             raise ValueError("Unsupported SQL query type.")
 
     def parse_select(self, query):
-        # Extended regular expression to include aggregate functions
-        pattern = r"""
-            select\s+(.*?)\s+from\s+(\w+)           # Select and From clauses
-            (?:\s+join\s+(\w+)\s+on\s+(.*?))?       # Optional JOIN clause
-            (?:\s+where\s+(.*?))?                   # Optional WHERE clause
-            (?:\s+group\s+by\s+(.*?))?              # Optional GROUP BY clause
-            (?:\s+order\s+by\s+(.*?))?              # Optional ORDER BY clause
-            $                                       # End of string
-        """
-        match = re.match(pattern, query, re.IGNORECASE | re.VERBOSE)
+        match = SELECT_PATTERN.match(query)
         if not match:
             raise ValueError("Invalid SQL SELECT query format.")
 
-        select_clause, from_table, join_table, join_condition, where_clause, group_by_clause, order_by_clause = match.groups()
+        select_clause, from_table, join_table, join_condition, where_clause, group_by_clause, order_by_clause, limit, offset = match.groups()
 
         # Handle aggregate functions in the select clause
         columns = self.parse_select_clause(select_clause)
@@ -43,6 +46,8 @@ class SQLParser:
         order_by_clause = match.group(7).strip() if match.group(7) else None
 
         query_data['order_by'] = order_by_clause
+        query_data['limit'] = int(limit) if limit else None
+        query_data['offset'] = int(offset) if offset else 0
 
         return query_data
 
@@ -53,9 +58,9 @@ class SQLParser:
         columns = []
         for part in select_clause.split(','):
             part = part.strip()
-            if part.lower().startswith(("count(", "sum(", "avg(")):  # Add more aggregate functions as needed
+            if part.lower().startswith(("count(", "sum(", "avg(", "min(", "max(")):  # Add more aggregate functions as needed
                 # Extracting aggregate function and column
-                function, column = re.match(r"(\w+)\((\w+)\)", part).groups()
+                function, column = AGGREGATE_PATTERN.match(part).groups()
                 columns.append({'function': function, 'column': column})
             else:
                 columns.append({'column': part})
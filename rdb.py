@@ -1,244 +1,1186 @@
+import bisect
 import csv
 import os
 import re
 from collections import defaultdict
 import json
 import heapq
+import io
+import itertools
+import mmap
+import multiprocessing
+import operator
 import os
-
-
-CHUNK_SIZE = 20
-
-
-def evaluate_condition(row, condition, headers):
-    operators = ['<', '<=', '=', '>', '>=', '!=']
-    
-    # Check if any of the operators is present in the condition
-    operator_used = None
-    for operator in operators:
-        if operator in condition:
-            operator_used = operator
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from aggregates import AGGREGATE_FUNCTIONS, finalize, merge_states, new_state, update_state
+from cache import LRUCache
+from locks import TableLocks
+
+
+SCAN_BATCH_BYTES = 64 * 1024  # Bytes of the table file parsed into rows per scan batch
+SCAN_WORKERS = os.cpu_count() or 1  # Worker processes of a parallel scan
+PARALLEL_SCAN_MIN_BYTES = 64 * 1024 * 1024  # Smaller tables are scanned in a single process
+SORT_RUN_SIZE = 10000  # Rows held in memory per run of the external ORDER BY sort
+SORT_MERGE_FANIN = 64  # Maximum number of runs merged in a single pass
+HASH_JOIN_MEMORY_LIMIT = 64 * 1024 * 1024  # Largest build table (bytes of CSV) hashed in memory
+JOIN_PARTITIONS = 32  # Partitions per side when the join has to spill to disk
+MAX_GROUPS_IN_MEMORY = 100000  # Groups held by GROUP BY before its partial states spill to disk
+GROUP_PARTITIONS = 32  # Partitions of the spilled GROUP BY states
+RESULT_CACHE_BYTES = 64 * 1024 * 1024  # Budget of the API's query result cache, in bytes of JSON
+PLAN_CACHE_SIZE = 256  # Parsed commands kept by the Parser
+BATCH_ROWS = 1024  # Rows per batch passed on by the operators that produce rows one at a time
+VACUUM_DEAD_FRACTION = 0.5  # A table file is vacuumed once dead rows take up this fraction of it
+# Result, join and sort files earlier versions wrote to the working directory, which are not tables
+LEGACY_TEMP_FILE = re.compile(r"temp_(\d+|join_\d+_(build|probe)_\d+|sort_\d+_\d+)\.csv")
+SELECT_CLAUSES = ("from", "join", "that", "groupby", "orderby", "limit", "offset")  # Keywords starting a clause of a select
+
+
+class Descending:
+    """Wraps a sort key value so that it orders in reverse inside a tuple key."""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+def numeric_key(value):
+    # Numbers sort numerically, anything that is not a number sorts after them
+    try:
+        return (0, int(value))
+    except ValueError:
+        try:
+            return (0, float(value))
+        except ValueError:
+            return (1, value)
+
+
+def parse_orderby(orderby_columns):
+    # Format: column [asc|desc], e.g. ['age desc', 'name']
+    parsed = []
+    for orderby_column in orderby_columns:
+        parts = orderby_column.split()
+        descending = len(parts) > 1 and parts[1] == 'desc'
+        parsed.append((parts[0], descending))
+    return parsed
+
+
+def make_sort_key(headers, data_types, orderby_columns):
+    """Build a row key for the orderby columns, typed by the data types row."""
+    key_parts = []
+    for column, descending in parse_orderby(orderby_columns):
+        index = headers.index(column)
+        convert = numeric_key if data_types[index] in ('int', 'float') else str
+        key_parts.append((index, convert, descending))
+
+    def sort_key(row):
+        return tuple(Descending(convert(row[index])) if descending else convert(row[index])
+                     for index, convert, descending in key_parts)
+
+    return sort_key
+
+
+CONDITION_PATTERN = re.compile(r"(.*?)(<=|>=|!=|=|<|>)(.*)")
+COMPARISONS = {
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+}
+
+
+def split_condition(condition):
+    # The terms of a condition, as OR groups of AND-ed 'column<op>value' strings
+    return [re.split(r"\s+and\s+", or_part.strip(), flags=re.IGNORECASE)
+            for or_part in re.split(r"\s+or\s+", condition.strip(), flags=re.IGNORECASE)]
+
+def compile_condition(condition, headers, data_types=None):
+    """
+    Compile a condition such as 'age>20' or 'name=leo or age<=18' into a predicate on a row.
+    The condition is parsed and its column resolved to an index once instead of once per row.
+    """
+    or_groups = [[compile_comparison(term, headers, data_types) for term in terms] for terms in split_condition(condition)]
+
+    if len(or_groups) == 1 and len(or_groups[0]) == 1:
+        return or_groups[0][0]
+    return lambda row: any(all(term(row) for term in terms) for terms in or_groups)
+
+def compile_conditions(conditions, headers, data_types=None):
+    # A list of conditions must all hold
+    predicates = [compile_condition(condition, headers, data_types) for condition in conditions]
+    if len(predicates) == 1:
+        return predicates[0]
+    return lambda row: all(predicate(row) for predicate in predicates)
+
+def compile_comparison(term, headers, data_types=None):
+    match = CONDITION_PATTERN.fullmatch(term.strip())
+    if not match:
+        return lambda row: False  # Condition is not valid
+    condition_column, operator_used, condition_value = [part.strip() for part in match.groups()]
+    index = headers.index(condition_column)
+
+    # Equality is a case-insensitive string comparison
+    if operator_used in ('=', '!='):
+        condition_value = condition_value.lower()
+        if operator_used == '=':
+            return lambda row: row[index].lower() == condition_value
+        return lambda row: row[index].lower() != condition_value
+
+    # Ordering compares numbers, unless the data types row says the column is a string
+    compare = COMPARISONS[operator_used]
+    if data_types is not None and data_types[index] not in ('int', 'float'):
+        condition_value = condition_value.lower()
+        return lambda row: compare(row[index].lower(), condition_value)
+    condition_value = float(condition_value)
+    return lambda row: compare(float(row[index]), condition_value)
+
+def count_quotes(mapped, start, end, chunk_bytes=1024 * 1024):
+    # Quote characters in a range of mapped bytes, which are copied a chunk at a time to be counted
+    return sum(mapped[chunk:min(chunk + chunk_bytes, end)].count(b'"') for chunk in range(start, end, chunk_bytes))
+
+def row_boundary(mapped, row_start, target, end):
+    """
+    The offset the row that the byte before target is in ends at, in mapped bytes up to end.
+    row_start is the start of a row at or before target. A newline only ends a row outside quotes,
+    where an even number of quote characters lie between it and the row start (an escaped quote is two).
+    """
+    newline = mapped.find(b'\n', target - 1, end)
+    quotes = count_quotes(mapped, row_start, newline) if newline != -1 else 0
+    while newline != -1 and quotes % 2:
+        following = mapped.find(b'\n', newline + 1, end)
+        if following != -1:
+            quotes += count_quotes(mapped, newline, following)
+        newline = following
+    return end if newline == -1 else newline + 1
+
+def read_record(file):
+    # The bytes of the CSV record at a binary file's position, over as many lines as its quoted fields run
+    record = file.readline()
+    while record.count(b'"') % 2:
+        line = file.readline()
+        if not line:
             break
-
-    if operator_used:
-        condition_column, condition_value = condition.split(operator_used)
-        condition_column_index = headers.index(condition_column)
-
-        # Get the value from the row for the condition column
-        row_value = row[condition_column_index]
-
-        # Evaluate the condition based on the operator
-        if operator_used == '<':
-            return float(row_value) < float(condition_value)
-        elif operator_used == '<=':
-            return float(row_value) <= float(condition_value)
-        elif operator_used == '=':
-            if isinstance(row_value, str):
-                return row_value.lower() == condition_value.lower()
-            else:
-                return row_value == condition_value
-        elif operator_used == '>':
-            return float(row_value) > float(condition_value)
-        elif operator_used == '>=':
-            return float(row_value) >= float(condition_value)
-        elif operator_used == '!=':
-            return row_value != condition_value
-
-    return False  # Condition is not valid
-    
-def read_csv_in_chunks_join(file_path, chunk_size=20):
+        record += line
+    return record
+
+def scan_csv(file_path, needed=None, batch_bytes=SCAN_BATCH_BYTES, start=None, end=None, deleted=()):
+    """
+    Memory-map a table file and yield its data rows in batches of about batch_bytes.
+    Batch boundaries are found with a newline search in the mapped bytes, skipping newlines inside
+    quoted fields, and each batch is parsed by the C csv parser in one go. With needed (a list of column indices) each row is
+    cut down to those columns, in that order, as soon as it is parsed.
+    start and end restrict the scan to a byte range starting on a row boundary.
+    deleted holds the sorted (offset, length) tombstones of dead rows, which are cut out of the batches.
+    """
+    project = projector(needed)
+    with open(file_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if start is None:
+                # Skip the header and data types rows
+                start = mapped.find(b'\n', mapped.find(b'\n') + 1) + 1
+                if start == 0:
+                    return
+            pos = start
+            end = len(mapped) if end is None else end
+            dead = bisect.bisect_left(deleted, (pos,))
+            while pos < end:
+                batch_end = row_boundary(mapped, pos, min(pos + batch_bytes, end), end)
+                pieces = []
+                while dead < len(deleted) and deleted[dead][0] < batch_end:
+                    offset, length = deleted[dead]
+                    pieces.append(mapped[pos:offset])
+                    pos = offset + length
+                    dead += 1
+                pieces.append(mapped[pos:batch_end])
+                text = b''.join(pieces).decode('utf-8')
+                # Without quotes no field holds a newline, and splitting on newlines is faster than reading a stream
+                rows = csv.reader(io.StringIO(text, newline='') if '"' in text else text.split('\n'))
+                if project is None:
+                    yield [row for row in rows if row]
+                else:
+                    yield [project(row) for row in rows if row]
+                pos = batch_end
+
+def split_csv_ranges(file_path, parts):
+    """
+    Cut the data rows of a table file into up to parts byte ranges that start and end on row boundaries.
+    Telling a row boundary from a newline in a quoted field takes counting the quotes before it, so
+    the file is read through once.
+    """
+    with open(file_path, 'rb') as file:
+        file.readline()
+        file.readline()
+        start = file.tell()
+        end = os.fstat(file.fileno()).st_size
+        bounds = [start]
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for part in range(1, parts):
+                target = start + (end - start) * part // parts
+                if target <= bounds[-1]:
+                    continue
+                # Move to the start of the row after the one the target falls in
+                boundary = row_boundary(mapped, bounds[-1], target, end)
+                if bounds[-1] < boundary < end:
+                    bounds.append(boundary)
+        bounds.append(end)
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1) if bounds[i] < bounds[i + 1]]
+
+def tombstones_between(deleted, start, end):
+    # The tombstones of the rows in a byte range
+    return deleted[bisect.bisect_left(deleted, (start,)):bisect.bisect_left(deleted, (end,))]
+
+def range_batches(file_path, start, end, deleted, conditions, headers, data_types, needed):
+    """Batches of the live rows in one byte range of a table file meeting the conditions, cut down to the needed columns."""
+    # Conditions are compiled here, in the worker, since compiled ones cannot be pickled
+    conditions_met = compile_conditions(conditions, [headers[index] for index in needed], [data_types[index] for index in needed]) if conditions else None
+    for batch in scan_csv(file_path, needed, start=start, end=end, deleted=deleted):
+        yield batch if conditions_met is None else [row for row in batch if conditions_met(row)]
+
+def filter_range(file_path, start, end, deleted, conditions, headers, data_types, needed):
+    # Worker of the parallel scan: the selected rows of one byte range
+    return [row for batch in range_batches(file_path, start, end, deleted, conditions, headers, data_types, needed) for row in batch]
+
+def projector(indices):
+    # A function cutting a row down to the columns at indices, or None to keep whole rows
+    if indices is None:
+        return None
+    if len(indices) == 1:
+        index = indices[0]
+        return lambda row: [row[index]]
+    return operator.itemgetter(*indices)
+
+def condition_columns(conditions, headers):
+    """Indices of the columns the conditions read, or None if they cannot be told apart."""
+    indices = set()
+    for condition in conditions or ():
+        for term in re.split(r"\s+(?:and|or)\s+", condition.strip(), flags=re.IGNORECASE):
+            match = CONDITION_PATTERN.fullmatch(term.strip())
+            if not match or match.group(1).strip() not in headers:
+                return None
+            indices.add(headers.index(match.group(1).strip()))
+    return indices
+
+def read_csv_header(file_path):
+    # Returns the header row and the data types row of a table file
     with open(file_path, 'r', encoding='utf-8') as file:
         reader = csv.reader(file)
-        chunk = []
-        headers = next(reader)  # First row is headers
-        for i, row in enumerate(reader, start=1):
-            chunk.append(row)
-            if i % chunk_size == 0:
-                yield headers, chunk
-                chunk = []
-        if chunk:
-            yield headers, chunk
-            
-def remove_csv_files():    
+        return next(reader), next(reader)
+
+def table_rows(file_path, deleted=()):
+    # Streams the live data rows of a table file
+    for batch in scan_csv(file_path, deleted=deleted):
+        yield from batch
+
+def locate_rows(file_path, deleted=frozenset()):
+    """
+    Yield (offset, length, row) for every live data row of a table file, skipping the rows whose
+    offsets are in deleted. Statements that change rows use the offsets to tombstone them.
+    """
+    with open(file_path, 'rb') as file:
+        file.readline()
+        file.readline()  # Skip the header and data types rows
+        offset = file.tell()
+        for records in batched(iter(lambda: read_record(file), b'')):
+            located, texts = [], []
+            for record in records:
+                if offset not in deleted and record.strip():
+                    located.append((offset, len(record)))
+                    texts.append(record.decode('utf-8'))
+                offset += len(record)
+            for (row_offset, length), row in zip(located, csv.reader(texts)):
+                yield row_offset, length, row
+
+def iter_csv_rows(file_path, skip=2):
+    # Streams the data rows of a CSV file, skipping the header and data types rows
+    with open(file_path, 'r', newline='', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        for _ in range(skip):
+            next(reader, None)
+        yield from reader
+
+def hash_join(build_rows, build_key, probe_rows, probe_key):
+    """Build a hash table on build_rows, then yield a (probe_row, build_row) pair per match."""
+    table = defaultdict(list)
+    for row in build_rows:
+        table[tuple(row[index] for index in build_key)].append(row)
+    for row in probe_rows:
+        for match in table.get(tuple(row[index] for index in probe_key), ()):
+            yield row, match
+
+def partition_csv_rows(rows, key, prefix, partitions):
+    # Spread rows over partition files by the hash of their key, returns the file paths
+    paths = [f'{prefix}_{i}.csv' for i in range(partitions)]
+    files = [open(path, 'w', newline='', encoding='utf-8') for path in paths]
     try:
-        files = os.listdir('.')
-
-        # Remove each file if it is a CSV file
+        writers = [csv.writer(file) for file in files]
+        for row in rows:
+            writers[hash(tuple(row[index] for index in key)) % partitions].writerow(row)
+    finally:
         for file in files:
-            try :
-                if file.startswith('temp'):
-                    os.remove(file)
-            except OSError:
-                pass    
-    except FileNotFoundError:
-        pass
-             
+            file.close()
+    return paths
+
+def index_file_path(table_name, column):
+    return f"{table_name}.{column}.idx"
+
+def tombstone_file_path(table_name):
+    return f"{table_name}.del"
+
+def index_csv_rows(file_path, column, offsets, start=None):
+    """
+    Add the byte offset of every data row from start on to offsets, keyed by the lower-cased
+    value of the column. Returns the file size the index now covers.
+    """
+    with open(file_path, 'rb') as file:
+        headers = next(csv.reader([file.readline().decode('utf-8')]))
+        file.readline()  # Skip the data types row
+        column_index = headers.index(column)
+        if start is not None:
+            file.seek(start)
+        while True:
+            offset = file.tell()
+            record = read_record(file)
+            if not record:
+                return offset
+            if not record.strip():
+                continue
+            row = next(csv.reader([record.decode('utf-8')]))
+            offsets.setdefault(row[column_index].lower(), []).append(offset)
+
+def locate_rows_at(file_path, offsets):
+    # Seek straight to each row instead of scanning the file, yielding (offset, length, row)
+    with open(file_path, 'rb') as file:
+        for offset in offsets:
+            file.seek(offset)
+            record = read_record(file)
+            yield offset, len(record), next(csv.reader([record.decode('utf-8')]))
+
+def spill_group_states(grouped_states, partitions):
+    # Append each group's partial states to the partition its key hashes to
+    for group_key, states in grouped_states.items():
+        partitions[hash(group_key) % len(partitions)].write(json.dumps([group_key, states]) + '\n')
+
+def merge_group_partition(path):
+    """Merge the partial states spilled to one partition; all states of a group land in the same one."""
+    grouped_states = {}
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            group_key, states = json.loads(line)
+            group_key = tuple(group_key)
+            if group_key in grouped_states:
+                for state, other in zip(grouped_states[group_key], states):
+                    merge_states(state, other)
+            else:
+                grouped_states[group_key] = states
+    return grouped_states
+
+def group_range(file_path, start, end, deleted, conditions, headers, data_types, needed, group_indices, agg_indices):
+    """Worker of the parallel GROUP BY: partial aggregate states of the selected rows' groups in one byte range."""
+    grouped_states = {}
+    for batch in range_batches(file_path, start, end, deleted, conditions, headers, data_types, needed):
+        for row in batch:
+            group_key = tuple(row[index] for index in group_indices)
+            states = grouped_states.get(group_key)
+            if states is None:
+                states = grouped_states[group_key] = [new_state() for _ in agg_indices]
+            for state, index in zip(states, agg_indices):
+                update_state(state, row[index])
+    return grouped_states
+
+def batched(rows, size=BATCH_ROWS):
+    # Cut a stream of rows into lists of up to size rows
+    rows = iter(rows)
+    batch = list(itertools.islice(rows, size))
+    while batch:
+        yield batch
+        batch = list(itertools.islice(rows, size))
+
+
+class Operator:
+    """
+    A stage of a select pipeline. headers and data_types describe its rows, and batches()
+    yields them as lists of rows, pulling batches from its input only as it needs them.
+    """
+    headers = None
+    data_types = None
+
+    def batches(self):
+        raise NotImplementedError
+
+    def rows(self):
+        for batch in self.batches():
+            yield from batch
+
+class Scan(Operator):
+    """Streams the live rows of a table file, keeping only the columns at needed (all by default)."""
+
+    def __init__(self, file_path, needed=None, deleted=()):
+        headers, data_types = read_csv_header(file_path)
+        self.file_path = file_path
+        self.needed = needed
+        self.deleted = deleted
+        self.headers = headers if needed is None else [headers[index] for index in needed]
+        self.data_types = data_types if needed is None else [data_types[index] for index in needed]
+
+    def batches(self):
+        return scan_csv(self.file_path, self.needed, deleted=self.deleted)
+
+class ParallelScan(Operator):
+    """
+    Scans a large table file in worker processes, each filtering one row-aligned byte range
+    and keeping the columns at needed. Batches come back in file order.
+    """
+
+    def __init__(self, db, file_path, conditions, needed, workers, deleted=()):
+        self.db = db
+        self.file_path = file_path
+        self.conditions = conditions
+        self.needed = needed
+        self.workers = workers
+        self.deleted = deleted
+        self.table_headers, self.table_types = read_csv_header(file_path)
+        self.headers = [self.table_headers[index] for index in needed]
+        self.data_types = [self.table_types[index] for index in needed]
+        self.ranges = split_csv_ranges(file_path, workers)
+
+    def run(self, function, *args):
+        # Run function over every byte range in the database's worker processes, yielding the results in range order
+        yield from self.db.scan_pool().map(function, *zip(*[(self.file_path, start, end, tombstones_between(self.deleted, start, end), self.conditions,
+                                                            self.table_headers, self.table_types, self.needed) + args
+                                                           for start, end in self.ranges]))
+
+    def batches(self):
+        return self.run(filter_range)
+
+    def group_states(self, group_indices, agg_indices):
+        """Partial aggregate states of the groups in each byte range, computed by the workers."""
+        return self.run(group_range, group_indices, agg_indices)
+
+class Rows(Operator):
+    """Rows already in memory, such as those an index lookup found."""
+
+    def __init__(self, headers, data_types, rows):
+        self.headers = headers
+        self.data_types = data_types
+        self.row_list = rows
+
+    def batches(self):
+        return batched(self.row_list)
+
+class Filter(Operator):
+    """Keeps the rows meeting every condition."""
+
+    def __init__(self, child, conditions):
+        self.child = child
+        self.headers = child.headers
+        self.data_types = child.data_types
+        self.conditions_met = compile_conditions(conditions, self.headers, self.data_types)
+
+    def batches(self):
+        conditions_met = self.conditions_met
+        for batch in self.child.batches():
+            batch = [row for row in batch if conditions_met(row)]
+            if batch:
+                yield batch
+
+class Project(Operator):
+    """Cuts rows down to the named columns, '*' keeping all of them."""
+
+    def __init__(self, child, columns):
+        self.child = child
+        indices = list(range(len(child.headers))) if columns[0] == "*" else [child.headers.index(column) for column in columns]
+        self.headers = [child.headers[index] for index in indices]
+        self.data_types = [child.data_types[index] for index in indices]
+        self.project = None if indices == list(range(len(child.headers))) else projector(indices)
+
+    def batches(self):
+        if self.project is None:
+            yield from self.child.batches()
+            return
+        for batch in self.child.batches():
+            yield list(map(self.project, batch))
+
+class HashJoin(Operator):
+    """
+    Joins two table files on equal keys; each row is the left row followed by the right one,
+    with columns named table.column. The smaller file is the build side and it is hashed in
+    memory if it fits in the database's hash join memory limit, otherwise both sides are
+    partitioned to disk first.
+    """
+
+    def __init__(self, db, left_table, left_key, right_table, right_key, temp_dir):
+        self.db = db
+        self.temp_dir = temp_dir
+        self.left_path, self.left_key = f'{left_table}.csv', left_key
+        self.right_path, self.right_key = f'{right_table}.csv', right_key
+        self.left_deleted = db.load_tombstones(left_table)['rows']
+        self.right_deleted = db.load_tombstones(right_table)['rows']
+        left_headers, left_types = read_csv_header(self.left_path)
+        right_headers, right_types = read_csv_header(self.right_path)
+        self.headers = [f'{left_table}.{col}' for col in left_headers] + [f'{right_table}.{col}' for col in right_headers]
+        self.data_types = left_types + right_types
+
+    def batches(self):
+        left_size = os.path.getsize(self.left_path)
+        right_size = os.path.getsize(self.right_path)
+        left_rows, right_rows = table_rows(self.left_path, self.left_deleted), table_rows(self.right_path, self.right_deleted)
+        if right_size <= left_size:
+            build_rows, build_key, probe_rows, probe_key, build_is_left = right_rows, self.right_key, left_rows, self.left_key, False
+        else:
+            build_rows, build_key, probe_rows, probe_key, build_is_left = left_rows, self.left_key, right_rows, self.right_key, True
+
+        if min(left_size, right_size) <= self.db.hash_join_memory_limit:
+            pairs = hash_join(build_rows, build_key, probe_rows, probe_key)
+        else:
+            pairs = self.db.grace_hash_join(build_rows, build_key, probe_rows, probe_key, self.temp_dir)
+        joined = (build_row + probe_row if build_is_left else probe_row + build_row for probe_row, build_row in pairs)
+        return batched(joined)
+
+class Aggregate(Operator):
+    """
+    One-pass GROUP BY. Each group keeps one constant-size aggregate state per aggregated column,
+    so several aggregates of the same column share it. When there are more than max_groups groups,
+    the partial states are hash-partitioned to disk and each partition is merged on its own.
+    Over a ParallelScan the workers compute partial states of their byte ranges, merged here in file order.
+    """
+
+    def __init__(self, db, child, columns, groupby, temp_dir, max_groups=None):
+        self.db = db
+        self.child = child
+        self.temp_dir = temp_dir
+        self.max_groups = max_groups or db.max_groups
+        columns = sorted(columns)
+        groupby = sorted(groupby)
+        headers = child.headers
+        self.group_indices = [headers.index(g) for g in groupby]
+
+        # Parse the input columns for aggregation functions
+        agg_columns = []  # Aggregated columns, each with one state per group
+        self.outputs = []  # (output name, aggregated column position, function) per aggregate
+        output_fieldnames = list(groupby)  # Start with groupby fields
+        for col in columns:
+            if '(' in col and ')' in col:
+                func, col_name = col.split('(')
+                col_name = col_name.strip(')')
+                agg_col_name = f"{func}({col_name})"  # Format as 'func(col_name)'
+                if col_name in groupby:
+                    raise ValueError(f"Column '{col_name}' cannot be both in groupby and an aggregation function")
+                if func not in AGGREGATE_FUNCTIONS:
+                    raise ValueError(f"Unsupported aggregate function: {func}")
+                if col_name not in agg_columns:
+                    agg_columns.append(col_name)
+                self.outputs.append((agg_col_name, agg_columns.index(col_name), func))
+                output_fieldnames.append(agg_col_name)
+            elif col not in groupby:
+                output_fieldnames.append(col)  # Non-aggregated fields
+        self.agg_indices = [headers.index(col) for col in agg_columns]
+
+        # Aggregates are numeric, grouped and plain columns keep their input type
+        data_types = dict(zip(headers, child.data_types))
+        self.headers = output_fieldnames
+        self.data_types = [data_types.get(col, 'int' if col.startswith('count(') else 'float') for col in output_fieldnames]
+
+    def batches(self):
+        group_indices, agg_indices = self.group_indices, self.agg_indices
+        grouped_states = {}
+        partitions = None
+        try:
+            if isinstance(self.child, ParallelScan):
+                for part in self.child.group_states(group_indices, agg_indices):
+                    for group_key, part_states in part.items():
+                        states = grouped_states.get(group_key)
+                        if states is None:
+                            partitions = self.db.make_room_for_group(grouped_states, partitions, self.max_groups, self.temp_dir)
+                            grouped_states[group_key] = part_states
+                        else:
+                            for state, other in zip(states, part_states):
+                                merge_states(state, other)
+            else:
+                for batch in self.child.batches():
+                    for row in batch:
+                        group_key = tuple(row[index] for index in group_indices)
+                        states = grouped_states.get(group_key)
+                        if states is None:
+                            partitions = self.db.make_room_for_group(grouped_states, partitions, self.max_groups, self.temp_dir)
+                            states = grouped_states[group_key] = [new_state() for _ in agg_indices]
+                        for state, index in zip(states, agg_indices):
+                            update_state(state, row[index])
+
+            if partitions is None:
+                yield from batched(self.output_rows(grouped_states))
+                return
+            spill_group_states(grouped_states, partitions)
+            grouped_states = None
+            for partition in self.db.close_group_partitions(partitions):
+                yield from batched(self.output_rows(merge_group_partition(partition)))
+        finally:
+            # Spilled partitions are removed even if the query stops early
+            for partition in partitions or ():
+                partition.close()
+                if os.path.exists(partition.name):
+                    os.remove(partition.name)
+
+    def output_rows(self, grouped_states):
+        width = len(self.headers)
+        for group_key, states in grouped_states.items():
+            row = list(group_key) + [finalize(func, states[position]) for _, position, func in self.outputs]
+            yield row + [''] * (width - len(row))
+
+class Sort(Operator):
+    """
+    External merge sort on the orderby columns. At most run_size rows are held in memory:
+    once the input grows past that, each full run is sorted and spilled to its own file and
+    the runs are merged with heapq.merge. With a limit only the first limit rows are kept,
+    selected with a bounded heap.
+    """
+
+    def __init__(self, db, child, orderby_columns, temp_dir, limit=None, run_size=None):
+        self.db = db
+        self.child = child
+        self.temp_dir = temp_dir
+        self.headers = child.headers
+        self.data_types = child.data_types
+        self.orderby_columns = orderby_columns
+        self.limit = limit
+        self.run_size = run_size or db.sort_run_size
+
+    def batches(self):
+        sort_key = make_sort_key(self.headers, self.data_types, self.orderby_columns)
+        if self.limit is not None:
+            yield from batched(heapq.nsmallest(self.limit, self.child.rows(), key=sort_key))
+            return
+
+        run_files = []
+        files = []
+        try:
+            run = []
+            for batch in self.child.batches():
+                run.extend(batch)
+                if len(run) >= self.run_size:
+                    run_files.append(self.db.write_sort_run(run, sort_key, len(run_files), self.temp_dir))
+                    run = []
+            # The last, partial run never needs to leave memory
+            run.sort(key=sort_key)
+            if not run_files:
+                yield from batched(run)
+                return
+
+            # Merge in several passes if there are more runs than we want open at once
+            while len(run_files) > SORT_MERGE_FANIN:
+                merged_runs = []
+                for i in range(0, len(run_files), SORT_MERGE_FANIN):
+                    merged_runs.append(self.db.merge_sort_runs(run_files[i:i + SORT_MERGE_FANIN], sort_key, len(run_files) + len(merged_runs), self.temp_dir))
+                run_files = merged_runs
+
+            files = [open(fname, 'r', newline='', encoding='utf-8') for fname in run_files]
+            readers = [csv.reader(f) for f in files]
+            yield from batched(heapq.merge(run, *readers, key=sort_key))
+        finally:
+            # Clean up the run files
+            for f in files:
+                f.close()
+            for fname in run_files:
+                if os.path.exists(fname):
+                    os.remove(fname)
+
+class Limit(Operator):
+    """Passes on the rows from offset on, at most limit of them, and stops pulling its input once it has them."""
+
+    def __init__(self, child, limit, offset=0):
+        self.child = child
+        self.headers = child.headers
+        self.data_types = child.data_types
+        self.limit = limit
+        self.offset = offset
+
+    def batches(self):
+        skip, remaining = self.offset, self.limit
+        if remaining == 0:
+            return
+        for batch in self.child.batches():
+            if skip:
+                if skip >= len(batch):
+                    skip -= len(batch)
+                    continue
+                batch, skip = batch[skip:], 0
+            if remaining is not None:
+                batch = batch[:remaining]
+                remaining -= len(batch)
+            yield batch
+            if remaining == 0:
+                return
+
 class Database:
-    def __init__(self):
-        remove_csv_files()
+    def __init__(self, sort_run_size=SORT_RUN_SIZE, hash_join_memory_limit=HASH_JOIN_MEMORY_LIMIT, join_partitions=JOIN_PARTITIONS,
+                 max_groups=MAX_GROUPS_IN_MEMORY, group_partitions=GROUP_PARTITIONS, scan_workers=SCAN_WORKERS,
+                 parallel_scan_min_bytes=PARALLEL_SCAN_MIN_BYTES):
+        self.sort_run_size = sort_run_size
+        self.hash_join_memory_limit = hash_join_memory_limit
+        self.join_partitions = join_partitions
+        self.max_groups = max_groups
+        self.group_partitions = group_partitions
+        self.scan_workers = scan_workers
+        self.parallel_scan_min_bytes = parallel_scan_min_bytes
         self.tables = {}
-        self.temp_table_count = 0
-        self.previous_temp_file = ""
+        self.csv_indexes = {}  # (table name, column) -> loaded index sidecar
+        self.tombstones = {}  # table name -> loaded tombstone sidecar
+        self.table_versions = {}  # table name -> number of writes to the table by this process
+        self.table_locks = TableLocks()  # Statements read a table under its read lock and write it under its write lock
+        self.catalog_lock = threading.Lock()  # Guards self.tables while it is refreshed
+        self.index_lock = threading.RLock()  # Guards the index and tombstone sidecars readers bring up to date
+        self.query_dirs = set()  # Private temp directories of the queries whose results are not yet read
+        self.scan_executor = None  # Worker processes of parallel scans, see scan_pool
+        self.pool_lock = threading.Lock()
         self.load_table_mapping()
         print(self.tables)
         
     def load_table_mapping(self):
+        """
+        Refresh the schema catalog from the table files in the working directory.
+        Only tables whose file changed since the last refresh have their header re-read.
+        """
+        with self.catalog_lock:
+            self.refresh_table_mapping()
+
+    def refresh_table_mapping(self):
+        table_files, index_files = {}, []
         for filename in os.listdir(os.getcwd()):
-            if filename.endswith('.csv'):
-                table_name = filename[:-4]  # Remove '.csv' from filename
-                with open(filename, 'r') as file:
-                    reader = csv.reader(file)
-                    first_two_rows = list(reader)[:2]
-                    header_row = first_two_rows[0]
-                    data_types_row = first_two_rows[1]
-                    self.tables[table_name] = {}
-                    self.tables[table_name]['schema'] = dict(zip(header_row, data_types_row))             
-                    
+            if filename.endswith('.csv') and not LEGACY_TEMP_FILE.fullmatch(filename):
+                table_files[filename[:-4]] = filename  # Remove '.csv' from filename
+            elif filename.endswith('.idx'):
+                index_files.append(filename)
+
+        for table_name in list(self.tables):
+            if table_name not in table_files:
+                del self.tables[table_name]
+
+        for table_name, filename in table_files.items():
+            mtime = os.stat(filename).st_mtime_ns
+            if table_name not in self.tables or self.tables[table_name].get('mtime') != mtime:
+                header_row, data_types_row = read_csv_header(filename)
+                self.tables[table_name] = {'schema': dict(zip(header_row, data_types_row)), 'mtime': mtime}
+
+        for table in self.tables.values():
+            table['indexes'] = set()
+        for filename in index_files:
+            table_name, column = filename[:-4].split('.', 1)
+            if table_name in self.tables:
+                self.tables[table_name]['indexes'].add(column)
+
+    def scan_pool(self):
+        """
+        The worker processes of parallel scans, started on first use and kept for later queries.
+        Workers come from a forkserver, not a fork of this process, whose other threads may hold locks.
+        """
+        with self.pool_lock:
+            if self.scan_executor is None:
+                context = multiprocessing.get_context('forkserver')
+                context.set_forkserver_preload(['rdb'])
+                self.scan_executor = ProcessPoolExecutor(max_workers=self.scan_workers, mp_context=context)
+            return self.scan_executor
+
+    def make_query_dir(self):
+        # Each query spills to and writes its result in a directory of its own, so concurrent queries never share a file
+        query_dir = tempfile.mkdtemp(prefix='rdb_query_')
+        self.query_dirs.add(query_dir)
+        return query_dir
+
+    def read_result(self, file_path):
+        """The text of a result file, whose query directory is then removed. Messages pass through unchanged."""
+        if not os.path.isfile(file_path):
+            return file_path
+        try:
+            with open(file_path, 'r', newline='', encoding='utf-8') as file:
+                return file.read()
+        finally:
+            self.remove_query_dir(os.path.dirname(file_path))
+
+    def remove_query_dir(self, query_dir):
+        """Remove a query's temp directory once its result is read; paths outside query directories are left alone."""
+        if query_dir in self.query_dirs:
+            self.query_dirs.discard(query_dir)
+            shutil.rmtree(query_dir, ignore_errors=True)
+
+    def replace_table_file(self, table_name, rows):
+        # Write the new file next to the table and swap it in, so no reader ever opens a half-written table
+        with open(f"{table_name}.csv.tmp", 'w', newline='') as file:
+            csv.writer(file).writerows(rows)
+        os.replace(f"{table_name}.csv.tmp", f"{table_name}.csv")
+
+    def read_tables(self, table_name, join=None):
+        """The tables a select reads: its own and the one it joins."""
+        return [table_name] + ([join.split(' on ')[0].strip()] if join else [])
+
+    def create_index(self, table_name, column):
+        with self.table_locks.write(table_name):
+            if table_name not in self.tables:
+                return f"Table {table_name} does not exist."
+            if column not in self.tables[table_name]['schema']:
+                return f"Column {column} does not exist."
+            self.tables[table_name].setdefault('indexes', set()).add(column)
+            self.build_csv_index(table_name, column)
+            return f"{index_file_path(table_name, column)} created successfully"
+
+    def build_csv_index(self, table_name, column):
+        """Index every row of the table file on the column and save the sidecar."""
+        offsets = {}
+        size = index_csv_rows(f"{table_name}.csv", column, offsets)
+        index = {'column': column, 'size': size, 'offsets': offsets}
+        self.save_csv_index(table_name, column, index)
+        return index
+
+    def save_csv_index(self, table_name, column, index):
+        with open(index_file_path(table_name, column), 'w') as file:
+            json.dump(index, file)
+        self.csv_indexes[(table_name, column)] = index
+
+    def load_csv_index(self, table_name, column):
+        """
+        Return the index sidecar of a table column, brought up to date with the table file.
+        Rows appended since the index was saved are indexed from its recorded size on;
+        a file that shrank was rewritten behind the index's back, so the index is rebuilt.
+        Readers of the table share the sidecar, so one brings it up to date at a time.
+        """
+        with self.index_lock:
+            index = self.csv_indexes.get((table_name, column))
+            if index is None:
+                with open(index_file_path(table_name, column), 'r') as file:
+                    index = json.load(file)
+
+            size = os.path.getsize(f"{table_name}.csv")
+            if index['size'] > size:
+                return self.build_csv_index(table_name, column)
+            if index['size'] < size:
+                index['size'] = index_csv_rows(f"{table_name}.csv", column, index['offsets'], start=index['size'])
+                self.save_csv_index(table_name, column, index)
+            self.csv_indexes[(table_name, column)] = index
+            return index
+
+    def rebuild_csv_indexes(self, table_name):
+        # Row offsets all move when a statement rewrites the table file
+        for column in self.tables[table_name].get('indexes', ()):
+            self.build_csv_index(table_name, column)
+
+    def index_offsets(self, table_name, conditions):
+        """
+        Use an index sidecar to find the offsets of the live rows that can match an equality condition.
+        Returns None when no condition has an indexed column; the conditions still have to be checked.
+        """
+        indexed_columns = self.tables[table_name].get('indexes', ())
+        for condition in conditions or ():
+            match = CONDITION_PATTERN.fullmatch(condition.strip())
+            if not match or re.search(r"\s(and|or)\s", condition, re.IGNORECASE):
+                continue
+            column, operator_used, value = [part.strip() for part in match.groups()]
+            if operator_used == '=' and column in indexed_columns:
+                offsets = self.load_csv_index(table_name, column)['offsets'].get(value.lower(), [])
+                # Indexes keep the offsets of dead rows until the table is vacuumed
+                deleted = self.load_tombstones(table_name)['offsets']
+                return sorted(offset for offset in offsets if offset not in deleted)
+        return None
+
+    def index_scan(self, table_name, conditions):
+        """Use an index sidecar to read only the rows that can match an equality condition, or return None."""
+        offsets = self.index_offsets(table_name, conditions)
+        if offsets is None:
+            return None
+        return (row for _, _, row in locate_rows_at(f"{table_name}.csv", offsets))
+
+    def load_tombstones(self, table_name):
+        """
+        The dead rows of a table, from its tombstone sidecar: 'rows' holds their sorted (offset, length)
+        pairs, 'offsets' the offsets as a set and 'dead_bytes' their total length. The sidecar's first
+        line names the table file it was made for, so one left behind by a rewritten file is ignored.
+        Tombstones added since the sidecar was last read are read from its recorded size on.
+        """
+        with self.index_lock:
+            inode = os.stat(f"{table_name}.csv").st_ino
+            tombstones = self.tombstones.get(table_name)
+            if tombstones is None or tombstones['inode'] != inode:
+                tombstones = {'inode': inode, 'size': 0, 'rows': [], 'offsets': frozenset(), 'dead_bytes': 0}
+
+            path = tombstone_file_path(table_name)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            if size > tombstones['size']:
+                with open(path, 'rb') as file:
+                    file.seek(tombstones['size'])
+                    data = file.read(size - tombstones['size'])
+                data = data[:data.rfind(b'\n') + 1]  # A line cut short by a crash is ignored
+                lines = data.splitlines()
+                if tombstones['size'] == 0 and (not lines or lines.pop(0) != str(inode).encode()):
+                    self.tombstones[table_name] = tombstones
+                    return tombstones
+                added = sorted(tuple(int(number) for number in line.split(b',')) for line in lines if line)
+                tombstones = {'inode': inode, 'size': tombstones['size'] + len(data),
+                              'rows': list(heapq.merge(tombstones['rows'], added)),
+                              'offsets': tombstones['offsets'].union(offset for offset, _ in added),
+                              'dead_bytes': tombstones['dead_bytes'] + sum(length for _, length in added)}
+            self.tombstones[table_name] = tombstones
+            return tombstones
+
+    def add_tombstones(self, table_name, located):
+        """Mark the rows at the (offset, length) pairs in located dead with a single append to the tombstone sidecar."""
+        tombstones = self.load_tombstones(table_name)
+        with open(tombstone_file_path(table_name), 'a' if tombstones['size'] else 'w') as file:
+            if tombstones['size']:
+                file.truncate(tombstones['size'])  # Drop a line cut short by a crash
+            else:
+                file.write(f"{tombstones['inode']}\n")
+            file.write(''.join(f"{offset},{length}\n" for offset, length in located))
+
+    def locate_matches(self, table_name, conditions):
+        """(offset, length, row) of each live row of the table meeting the conditions, found with an index if one applies."""
+        file_path = f"{table_name}.csv"
+        headers, data_types = read_csv_header(file_path)
+        conditions_met = compile_conditions(conditions, headers, data_types)
+        offsets = self.index_offsets(table_name, conditions)
+        if offsets is None:
+            located = locate_rows(file_path, self.load_tombstones(table_name)['offsets'])
+        else:
+            located = locate_rows_at(file_path, offsets)
+        return [(offset, length, row) for offset, length, row in located if conditions_met(row)]
+
+    def vacuum(self, table_name):
+        with self.table_locks.write(table_name):
+            if table_name not in self.tables:
+                return f"Table {table_name} does not exist."
+            self.compact_table(table_name)
+            return f"{table_name}.csv vacuumed successfully"
+
+    def compact_table(self, table_name):
+        """Rewrite the table file without its dead rows and drop its tombstones. The caller holds the table's write lock."""
+        file_path = f"{table_name}.csv"
+        deleted = self.load_tombstones(table_name)['rows']
+        if deleted:
+            headers, data_types = read_csv_header(file_path)
+            self.replace_table_file(table_name, itertools.chain([headers, data_types], table_rows(file_path, deleted)))
+            self.rebuild_csv_indexes(table_name)
+        # The sidecar no longer names the table file, so a crash before it is removed leaves it ignored
+        if os.path.exists(tombstone_file_path(table_name)):
+            os.remove(tombstone_file_path(table_name))
+        with self.index_lock:
+            self.tombstones.pop(table_name, None)
+
+    def vacuum_if_needed(self, table_name):
+        # Vacuum once enough of the table file is dead rows, which keeps its cost proportional to the rows removed
+        if self.load_tombstones(table_name)['dead_bytes'] >= os.path.getsize(f"{table_name}.csv") * VACUUM_DEAD_FRACTION:
+            self.compact_table(table_name)
+
+    def storage_signature(self, table_name):
+        """Modification times and sizes of the table file and its tombstone sidecar, which any process's writes change."""
+        signature = []
+        for path in (f"{table_name}.csv", tombstone_file_path(table_name)):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def bump_table_version(self, table_name):
+        # Cached results of queries on the table are keyed by its old version and never hit again
+        self.table_versions[table_name] = self.table_versions.get(table_name, 0) + 1
+
     def display_tables(self):
         return '\n'.join(self.tables.keys())
     
     def create_table(self, table_name, schema):
-        if table_name in self.tables:
-            return f"Table {table_name} already exists."
-        # Schema format: [('name', 'str'), ('age', 'int')]
-        self.tables[table_name] = {'schema': {col: dtype for col, dtype in schema}, 'rows': []}
-        with open(f"{table_name}.csv", 'w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow([col for col, _ in schema])
-            writer.writerow([col for _, col in schema])
-        return f"{table_name}.csv created successfully"
+        with self.table_locks.write(table_name):
+            if table_name in self.tables:
+                return f"Table {table_name} already exists."
+            # Schema format: [('name', 'str'), ('age', 'int')]
+            with self.catalog_lock:
+                self.tables[table_name] = {'schema': {col: dtype for col, dtype in schema}, 'rows': []}
+            with open(f"{table_name}.csv", 'w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow([col for col, _ in schema])
+                writer.writerow([col for _, col in schema])
+            self.bump_table_version(table_name)
+            return f"{table_name}.csv created successfully"
 
     def insert_into(self, table_name, values):
-        if table_name not in self.tables:
-            return f"Table {table_name} does not exist."
-
-        schema = self.tables[table_name]['schema']
-        if len(values) != len(schema):
-            return "Column count doesn't match value count."
-
-        # Data type validation
-        for val, (col, dtype) in zip(values, schema.items()):
-            if dtype == 'int':
-                if not str(val).isdigit():
-                    return f"Value for {col} should be an integer."
-            elif dtype == 'str':
-                if not isinstance(val, str):
-                    return f"Value for {col} should be a string."
-
-        # Write to CSV
-        with open(f"{table_name}.csv", 'a', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(values)
-        return f"{table_name}.csv"
+        with self.table_locks.write(table_name):
+            if table_name not in self.tables:
+                return f"Table {table_name} does not exist."
+
+            schema = self.tables[table_name]['schema']
+            if len(values) != len(schema):
+                return "Column count doesn't match value count."
+
+            # Data type validation
+            for val, (col, dtype) in zip(values, schema.items()):
+                if dtype == 'int':
+                    if not str(val).isdigit():
+                        return f"Value for {col} should be an integer."
+                elif dtype == 'str':
+                    if not isinstance(val, str):
+                        return f"Value for {col} should be a string."
+
+            # Write to CSV
+            with open(f"{table_name}.csv", 'a', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(values)
+            self.bump_table_version(table_name)
+            return f"{table_name}.csv"
     
     def delete_from(self, table_name, conditions):
-        if table_name not in self.tables:
-            return f"Table {table_name} does not exist."
-
-
-        updated_data = []
-        with open(f"{table_name}.csv", 'r', newline='') as file:
-            reader = csv.reader(file)
-            headers = next(reader)  # Read the header row
-            data_types = next(reader)  # Read the data types row
-            updated_data.append(headers)  # Preserve the header row
-            updated_data.append(data_types)  # Preserve the data types row
-            for row in reader:
-                row_updated = False
-                # Evaluate all conditions for each row
-                conditions_met = all(evaluate_condition(row, condition, headers) for condition in conditions)
-                if not conditions_met:
-                    # Update the specified columns with the new values
-                    updated_data.append(row)
-
-        with open(f"{table_name}.csv", 'w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerows(updated_data)
-
-        count = len(updated_data)
-        return f"{table_name}.csv"
+        """
+        Delete the rows meeting the conditions by tombstoning them, instead of rewriting the table file.
+        The file is vacuumed once dead rows take up too much of it.
+        """
+        with self.table_locks.write(table_name):
+            if table_name not in self.tables:
+                return f"Table {table_name} does not exist."
+
+            matches = self.locate_matches(table_name, conditions)
+            if matches:
+                self.add_tombstones(table_name, [(offset, length) for offset, length, _ in matches])
+                self.bump_table_version(table_name)
+                self.vacuum_if_needed(table_name)
+            return f"{table_name}.csv"
     
     def update_set(self, table_name, conditions, new_values):
-        if table_name not in self.tables:
-            return f"Table {table_name} does not exist."
-
-        updated_data = []
-        with open(f"{table_name}.csv", 'r', newline='') as file:
-            reader = csv.reader(file)
-            headers = next(reader)  # Read the header row
-            data_types = next(reader)  # Read the data types row
-            updated_data.append(headers)  # Preserve the header row
-            updated_data.append(data_types)  # Preserve the data types row
-            for row in reader:
-                row_updated = False
-                # Evaluate all conditions for each row
-                conditions_met = all(evaluate_condition(row, condition, headers) for condition in conditions)
-                if conditions_met:
+        """
+        Update the rows meeting the conditions by appending their new versions to the table file
+        and tombstoning the old ones, so an update writes only the rows it changes.
+        Updated rows move to the end of the file.
+        """
+        with self.table_locks.write(table_name):
+            if table_name not in self.tables:
+                return f"Table {table_name} does not exist."
+
+            headers, _ = read_csv_header(f"{table_name}.csv")
+            assignments = [(headers.index(col.strip()), new_val.strip()) for col, new_val in (new_value.split('=', 1) for new_value in new_values)]
+            matches = self.locate_matches(table_name, conditions)
+            if matches:
+                for _, _, row in matches:
                     # Update the specified columns with the new values
-                    for new_value in new_values:
-                        col, new_val = new_value.split('=')
-                        col_index = headers.index(col)
+                    for col_index, new_val in assignments:
                         row[col_index] = new_val
-                    row_updated = True
-                updated_data.append(row)
-                
-        with open(f"{table_name}.csv", 'w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerows(updated_data)
-
-        return f"{table_name}.csv"
+                # The new versions go in before the old ones are tombstoned, so no row is ever missing;
+                # indexes pick them up like inserted rows
+                with open(f"{table_name}.csv", 'a', newline='') as file:
+                    csv.writer(file).writerows(row for _, _, row in matches)
+                self.add_tombstones(table_name, [(offset, length) for offset, length, _ in matches])
+                self.bump_table_version(table_name)
+                self.vacuum_if_needed(table_name)
+            return f"{table_name}.csv"
     
-    def select_from(self, table_name, conditions=None, columns=None, join=None, groupby=None, order_by=None):
+    def select_from(self, table_name, conditions=None, columns=None, join=None, groupby=None, order_by=None, limit=None, offset=0):
+        """
+        Run a select as a pipeline of operators streaming row batches to each other:
+        scan or join, filter, project or aggregate, sort, limit.
+        Only the result is written out, to a temp file whose path is returned.
+        """
         if table_name not in self.tables:
             return f"Table {table_name} does not exist."
-        file_path = f"{table_name}.csv"
-        columns_with_agg = columns.copy()
+        query_dir = self.make_query_dir()
+        try:
+            with self.table_locks.read(*self.read_tables(table_name, join)):
+                return self.write_result(self.select_pipeline(table_name, conditions, columns, join, groupby, order_by, limit, offset, query_dir), query_dir)
+        except BaseException:
+            self.remove_query_dir(query_dir)
+            raise
+
+    def select_pipeline(self, table_name, conditions=None, columns=None, join=None, groupby=None, order_by=None, limit=None, offset=0, temp_dir=None):
+        """
+        Build the operator pipeline of a select; nothing is read until its batches are pulled.
+        Operators that spill write their files under temp_dir.
+        """
+        columns = columns or ['*']
         columns_without_agg = [col.split('(')[1].strip(')') if '(' in col else col for col in columns]
-        
+        orderby_columns = [column for column, _ in parse_orderby(order_by or [])]
+
         if join:
-            self.join_tables(table_name, columns_without_agg, join)
-            file_path = self.previous_temp_file
-    
-        selected_data = []
-        header_processed = False
-
-        for chunk in read_csv_in_chunks(file_path, CHUNK_SIZE):
-            if not header_processed:
-                header = {column: index for index, column in enumerate(chunk[0])}
-                data_types = chunk[1]
-                if columns_without_agg is None or columns_without_agg[0] == "*":
-                    selected_columns_indices = list(range(len(chunk[0])))
-                else:
-                    selected_columns_indices = [header[column] for column in columns_without_agg]
-                selected_data.append([chunk[0][index] for index in selected_columns_indices])  # Preserve the selected header
-                selected_data.append([data_types[index] for index in selected_columns_indices])  # Preserve the data types
-                header_processed = True
-                chunk = chunk[2:]  # Remove header and data types rows
-            
-            headers = list(header.keys())
-            for row in chunk:
-                if conditions:
-                    conditions_met = all(evaluate_condition(row, condition, headers) for condition in conditions)
-                    if conditions_met:
-                        selected_row = [row[index] for index in selected_columns_indices]
-                        selected_data.append(selected_row)
-                else:
-                    # If no conditions, add row directly
-                    selected_row = [row[index] for index in selected_columns_indices]
-                    selected_data.append(selected_row)
-        out_put_file = f'temp_{self.temp_table_count}.csv'
-        self.previous_temp_file = out_put_file
-        self.temp_table_count += 1  
-        with open(out_put_file, 'w', newline='', encoding='utf-8') as csvfile:
+            source = self.join_source(table_name, join, temp_dir)
+            if conditions:
+                source = Filter(source, conditions)
+        else:
+            # A LIMIT without blocking operators reads only the first rows, which a parallel scan would not
+            parallel = bool(groupby or order_by) or limit is None
+            # ORDER BY may name an aggregate's output, which the scan has no column for
+            scan_orderby = [column for column in orderby_columns if column in self.tables[table_name]['schema']]
+            source = self.table_source(table_name, conditions, columns_without_agg + (groupby or []) + scan_orderby, parallel)
+
+        # Rows past the end of the LIMIT are never needed
+        sort_limit = offset + limit if limit is not None else None
+        if groupby:
+            source = Aggregate(self, source, columns, groupby, temp_dir)
+        elif order_by and not set(orderby_columns) <= set(columns_without_agg) and columns_without_agg[0] != '*':
+            # Sort on columns that are not selected before they are projected away
+            source = Project(Sort(self, source, order_by, temp_dir, limit=sort_limit), columns_without_agg)
+            order_by = None
+        else:
+            source = Project(source, columns_without_agg)
+        if order_by:
+            source = Sort(self, source, order_by, temp_dir, limit=sort_limit)
+        if limit is not None or offset:
+            source = Limit(source, limit, offset)
+        return source
+
+    def table_source(self, table_name, conditions, columns, parallel=True):
+        """
+        The live rows of a table meeting the conditions. Point selects on an indexed column seek to
+        the matching rows, large tables are scanned in parallel, anything else is streamed.
+        Scans only keep the columns that are selected or tested (projection pushdown).
+        """
+        file_path = f"{table_name}.csv"
+        headers, data_types = read_csv_header(file_path)
+        rows = self.index_scan(table_name, conditions)
+        if rows is not None:
+            return Filter(Rows(headers, data_types, rows), conditions)
+
+        needed = condition_columns(conditions, headers)
+        if needed is None or "*" in columns:
+            needed = list(range(len(headers)))
+        else:
+            needed = sorted(needed.union(headers.index(column) for column in columns))
+
+        deleted = self.load_tombstones(table_name)['rows']
+        if parallel and self.scan_workers > 1 and os.path.getsize(file_path) >= self.parallel_scan_min_bytes:
+            scan = ParallelScan(self, file_path, conditions, needed, self.scan_workers, deleted)
+            if len(scan.ranges) > 1:
+                return scan
+        source = Scan(file_path, None if len(needed) == len(headers) else needed, deleted)
+        return Filter(source, conditions) if conditions else source
+
+    def join_source(self, table_name, join_clause, temp_dir):
+        """A HashJoin of the table with the one in the join clause, 'other_table on t1.col=t2.col[,...]'."""
+        join_table, on_clauses = join_clause.split(' on ')
+        join_table = join_table.strip()
+        main_headers, _ = read_csv_header(f'{table_name}.csv')
+        join_headers, _ = read_csv_header(f'{join_table}.csv')
+
+        # Resolve the join keys to column indices once, whichever side of '=' each table is on
+        main_key, join_key = [], []
+        for on_clause in on_clauses.split(','):
+            left, right = [side.strip() for side in on_clause.split('=')]
+            if left.split('.')[0] != table_name:
+                left, right = right, left
+            main_key.append(main_headers.index(left.split('.')[1]))
+            join_key.append(join_headers.index(right.split('.')[1]))
+        return HashJoin(self, table_name, main_key, join_table, join_key, temp_dir)
+
+    def write_result(self, pipeline, query_dir):
+        """Pull every batch of a pipeline into a result file in query_dir with the header and data types rows, returning its path."""
+        output_file = os.path.join(query_dir, 'result.csv')
+        with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
             writer = csv.writer(csvfile)
-            writer.writerows(selected_data)                  
-        self.perform_groupby(columns_with_agg, groupby)
-        self.orderby_csv(order_by)
-        # Convert the selected data to a formatted string
-        # selected_rows = [", ".join(row) for row in selected_data]
-
-        # return "\n".join(selected_rows)
-        return self.previous_temp_file
+            writer.writerow(pipeline.headers)
+            writer.writerow(pipeline.data_types)
+            for batch in pipeline.batches():
+                writer.writerows(batch)
+        return output_file
 
     def display_table(self, table_name):
         if table_name not in self.tables:
@@ -246,294 +1188,152 @@ class Database:
         # with open(f"{table_name}.csv", 'r') as file:
         #     reader = csv.reader(file)
         #     return "\n".join([", ".join(row) for row in reader])
-        return f"{table_name}.csv"
+        if not self.load_tombstones(table_name)['rows']:
+            return f"{table_name}.csv"
+        # The table file still holds dead rows, so the live ones are written out like a select result
+        return self.write_result(self.table_source(table_name, None, ["*"], parallel=False), self.make_query_dir())
+
+    def make_room_for_group(self, grouped_states, partitions, max_groups, temp_dir):
+        # Too many groups to hold: move the partial states to disk and start over
+        if len(grouped_states) >= max_groups:
+            partitions = partitions or self.open_group_partitions(temp_dir)
+            spill_group_states(grouped_states, partitions)
+            grouped_states.clear()
+        return partitions
+
+    def open_group_partitions(self, temp_dir):
+        paths = [os.path.join(temp_dir, f'group_{i}.jsonl') for i in range(self.group_partitions)]
+        return [open(path, 'w', encoding='utf-8') for path in paths]
+
+    def close_group_partitions(self, partitions):
+        for partition in partitions:
+            partition.close()
+        return [partition.name for partition in partitions]
+
+    def grace_hash_join(self, build_rows, build_key, probe_rows, probe_key, temp_dir):
+        """
+        Partitioned hash join for build sides too large to hash in memory.
+        The rows of both tables are hash-partitioned on the join key into temp files, then each
+        pair of partitions is joined in memory.
+        """
+        partition_prefix = os.path.join(temp_dir, 'join')
+        build_partitions = partition_csv_rows(build_rows, build_key, f'{partition_prefix}_build', self.join_partitions)
+        probe_partitions = partition_csv_rows(probe_rows, probe_key, f'{partition_prefix}_probe', self.join_partitions)
+        try:
+            for build_partition, probe_partition in zip(build_partitions, probe_partitions):
+                yield from hash_join(iter_csv_rows(build_partition, skip=0), build_key,
+                                     iter_csv_rows(probe_partition, skip=0), probe_key)
+        finally:
+            for partition in build_partitions + probe_partitions:
+                os.remove(partition)
+
+    def write_sort_run(self, rows, sort_key, run_number, temp_dir):
+        """Sort one run in memory and spill it to its own file."""
+        rows.sort(key=sort_key)
+        run_file = os.path.join(temp_dir, f'sort_{run_number}.csv')
+        with open(run_file, 'w', newline='', encoding='utf-8') as file:
+            csv.writer(file).writerows(rows)
+        return run_file
+
+    def merge_sort_runs(self, run_files, sort_key, run_number, temp_dir):
+        """Merge several sorted run files into a single new run file."""
+        merged_file = os.path.join(temp_dir, f'sort_{run_number}.csv')
+        files = [open(fname, 'r', newline='', encoding='utf-8') for fname in run_files]
+        try:
+            with open(merged_file, 'w', newline='', encoding='utf-8') as outfile:
+                readers = [csv.reader(f) for f in files]
+                csv.writer(outfile).writerows(heapq.merge(*readers, key=sort_key))
+        finally:
+            for f in files:
+                f.close()
+                os.remove(f.name)
+        return merged_file
 
-    def read_csv_in_chunks(file_path, chunk_size=CHUNK_SIZE):
-        with open(file_path, 'r', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            chunk = []
-            for i, row in enumerate(reader):
-                if i == 0:
-                    headers = row  # Capture headers to yield with each chunk
-                    continue
-                chunk.append(row)
-                if (i % chunk_size == 0) or (i == 0):
-                    yield headers, chunk
-                    chunk = []
-            if chunk:
-                yield headers, chunk
-                
-            
-    def perform_groupby(self, columns, groupby, chunk_size=CHUNK_SIZE):
-        if not groupby or not columns:
-            return
-        # Function to write data to CSV
-        def write_csv(file_path, data, fieldnames):
-            with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(data)
-        columns.sort()
-        groupby.sort()
-        # Parse the input columns for aggregation functions
-        agg_functions = {}
-        output_fieldnames = list(groupby)  # Start with groupby fields
-        for col in columns:
-            if '(' in col and ')' in col:
-                func, col_name = col.split('(')
-                col_name = col_name.strip(')')
-                agg_col_name = f"{func}({col_name})"  # Format as 'func(col_name)'
-                if col_name in groupby:
-                    raise ValueError(f"Column '{col_name}' cannot be both in groupby and an aggregation function")
-                agg_functions[col_name] = func
-                output_fieldnames.append(agg_col_name)
-            elif col not in groupby:
-                output_fieldnames.append(col)  # Non-aggregated fields
-
-        # Initialize grouping and aggregation structures
-        grouped_data = {}
-
-        # Process each chunk of data
-        for headers, chunk in read_csv_in_chunks_group(self.previous_temp_file, chunk_size=chunk_size):
-            # Convert chunk to list of dictionaries for easier processing
-            dict_chunk = [dict(zip(headers, row)) for row in chunk]
-
-            # Perform grouping and aggregation for each chunk
-            for row in dict_chunk:
-                group_key = tuple(row[g] for g in groupby)
-                if group_key not in grouped_data:
-                    grouped_data[group_key] = {col: [] for col in agg_functions}
-                
-                for agg_col in agg_functions:
-                    try:
-                        grouped_data[group_key][agg_col].append(float(row[agg_col]))  # Assuming numeric values
-                    except ValueError:
-                        # Handle non-numeric values, skip if not convertible
-                        pass
-
-        # Aggregate the grouped data
-        for key, values in grouped_data.items():
-            for col, vals in values.items():
-                if agg_functions[col] == 'sum':
-                    grouped_data[key][col] = sum(vals)
-                elif agg_functions[col] == 'avg':
-                    grouped_data[key][col] = sum(vals) / len(vals) if vals else 0
-                elif agg_functions[col] == 'max':
-                    grouped_data[key][col] = max(vals) if vals else None
-                elif agg_functions[col] == 'min':
-                    grouped_data[key][col] = min(vals) if vals else None
-
-        # Prepare data for writing to CSV
-        output_data = []
-        for key, values in grouped_data.items():
-            row = dict(zip(groupby, key))
-            for col, val in values.items():
-                row[f"{agg_functions[col]}({col})"] = val
-            output_data.append(row)
-
-        # Write to the output CSV file
-        output_csv_path = f'temp_{self.temp_table_count}.csv'
-        write_csv(output_csv_path, output_data, output_fieldnames)
-        self.previous_temp_file = output_csv_path
-        self.temp_table_count += 1            
-                  
-    def join_tables(self, table_name, columns, join_clause):
-        if not join_clause:
-            return
-        # Parse the join clause
-        join_table, on_clauses = join_clause.split(' on ')
-        join_conditions = [cond.split('=') for cond in on_clauses.split(',')]
-
-        # Read main table and join table in chunks
-        main_table_path = f'{table_name}.csv'
-        join_table_path = f'{join_table}.csv'
-
-        headers_written = False
-
-        for main_headers, main_chunk in read_csv_in_chunks_join(main_table_path, CHUNK_SIZE/2):
-            for join_headers, join_chunk in read_csv_in_chunks_join(join_table_path, CHUNK_SIZE/2):
-                # Perform the join for each chunk pair
-                joined_data = []
-                for main_row in main_chunk:
-                    for join_row in join_chunk:
-                        if all(main_row[main_headers.index(main_col.split('.')[1])] == join_row[join_headers.index(join_col.split('.')[1])] for main_col, join_col in join_conditions):
-                            # Construct the joined row based on the selected columns
-                            joined_row = {}
-                            for col in columns:
-                                table, col_name = col.split('.')
-                                if table == table_name:
-                                    col_index = main_headers.index(col_name)
-                                    joined_row[col] = main_row[col_index]
-                                else:
-                                    col_index = join_headers.index(col_name)
-                                    joined_row[col] = join_row[col_index]
-                            joined_data.append(joined_row)
-
-                # Write output to a CSV file
-                out_put_file = f'temp_{self.temp_table_count}.csv'
-                with open(out_put_file, 'a', newline='') as file:
-                    writer = csv.DictWriter(file, fieldnames=columns)
-                    if not headers_written:
-                        writer.writeheader()
-                        headers_written = True
-                    writer.writerows(joined_data)
-                    
-        self.previous_temp_file = out_put_file
-        self.temp_table_count += 1
-
-        return out_put_file  # Return the path to the output file for reference
-    
-    def orderby_csv(self, orderby_columns, chunk_size=CHUNK_SIZE):
-        if not orderby_columns:
-            return
-        # Determine the indices of the orderby columns
-        file_path = self.previous_temp_file
-        with open(file_path, 'r', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            headers = next(reader)
-            data_types = next(reader)
-            orderby_indices = [headers.index(col) for col in orderby_columns]
-
-        sorted_data = []
-        first_chunk = True
-        for chunk in read_csv_in_chunks(file_path, chunk_size):
-            # Skip headers and data types for subsequent chunks
-            if first_chunk:
-                first_chunk = False
-                chunk = chunk[2:]
-
-            # Sort the chunk
-            chunk.sort(key=lambda row: tuple(row[index] for index in orderby_indices))
-            sorted_data.extend(chunk)
-
-        # Write the sorted data to a file
-        output_file_path = f'temp_{self.temp_table_count}.csv'
-        with open(output_file_path, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(headers)  # Write headers
-            writer.writerow(data_types)  # Write data types
-            writer.writerows(sorted_data)
-        self.previous_temp_file = output_file_path
-        self.temp_table_count += 1
-        
-    def merge_sort_csv(self, orderby_columns, chunk_size=CHUNK_SIZE):
-        if not orderby_columns:
-            return
-
-        file_path = self.previous_temp_file
-        temp_files = []
-        
-        with open(file_path, 'r', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            headers = next(reader)
-            data_types = next(reader)
-            orderby_indices = [headers.index(col) for col in orderby_columns]
-
-            # Sort and write each chunk to a temporary file
-            for chunk in read_csv_in_chunks(file_path, chunk_size):
-                chunk.sort(key=lambda row: tuple(row[index] for index in orderby_indices))
-                temp_file_name = f'temp_{len(temp_files)}.csv'
-                with open(temp_file_name, 'w', newline='', encoding='utf-8') as temp_file:
-                    csv.writer(temp_file).writerows(chunk)
-                temp_files.append(temp_file_name)
-
-        # Merge sorted chunks
-        output_file_path = f'temp_{self.temp_table_count}.csv'
-        with open(output_file_path, 'w', newline='', encoding='utf-8') as outfile:
-            # Write headers and data types
-            writer = csv.writer(outfile)
-            writer.writerow(headers)
-            writer.writerow(data_types)
-
-            # Merge all files
-            files = [open(fname, 'r', newline='', encoding='utf-8') for fname in temp_files]
-            readers = [csv.reader(f) for f in files]
-            sorted_rows = heapq.merge(*readers, key=lambda row: tuple(row[index] for index in orderby_indices))
-            writer.writerows(sorted_rows)
+class Parser:
+    def __init__(self, plan_cache_size=PLAN_CACHE_SIZE):
+        self.plan_cache = LRUCache(plan_cache_size)  # command -> PreparedCommand, one unit of budget per entry
 
-        # Clean up temporary files
-        for f in files:
-            f.close()
-            os.remove(f.name)
+    def prepare(self, command):
+        """Parse a command into a PreparedCommand, answering repeated commands from the plan cache."""
+        prepared = self.plan_cache.get(command)
+        if prepared is None:
+            prepared = PreparedCommand(self.parse_command(command))
+            self.plan_cache.put(command, prepared, 1)
+        return prepared
 
-        self.previous_temp_file = output_file_path
-        self.temp_table_count += 1
+    def parse(self, command):
+        """Parse a command, answering repeated commands from the plan cache. The result must not be modified."""
+        return self.prepare(command).action
 
-class Parser:
     # Usage: 
-    def parse(self, command):
+    def parse_command(self, command):
         tokens = command.lower().split()
         if tokens[0] == "make" and tokens[1] == "table":
             # Format: make table table_name column_name1:data_type1, column_name2:data_type2
             table_name = tokens[2]
             columns = [(col.split(':')[0], col.split(':')[1]) for col in tokens[3].split(',')]
             return ("create_table", table_name, columns)
+        elif tokens[0] == "make" and tokens[1] == "index":
+            # Format: make index table_name column_name
+            return ("create_index", tokens[2], tokens[3])
         elif tokens[0] == "add" and tokens[1] == "into":
             # Format: add into table_name value1, value2, value3
             table_name = tokens[2]
             values = tokens[3].split(',')
             return ("insert_into", table_name, values)
+        elif tokens[0] == "vacuum":
+            # Format: vacuum table_name
+            return ("vacuum", tokens[1])
         elif tokens[0] == "show" and tokens[1] == "table":
             # Format: show table table_name
             table_name = tokens[2]
             return ("display_table", table_name)
         elif tokens[0] == "delete" and tokens[1] == "from" and tokens[3] == "that":
-            # Format: delete from table_name where column_name=value
+            # Format: delete from table_name that column_name=value [and|or ...]
+            # The condition runs to the end of the command, like a select's 'that' clause
             table_name = tokens[2]
-            return ("delete_from", table_name, tokens[4].split(','))
-        elif tokens[0] == "update" and tokens[4] == "to":
-            # Format: update table_name that column_name1=value1,column_name2=value2 to column_name1=value1,column_name2=value2
+            return ("delete_from", table_name, " ".join(tokens[4:]).split(','))
+        elif tokens[0] == "update" and tokens[2] == "that" and "to" in tokens[4:]:
+            # Format: update table_name that column_name1=value1,column_name2=value2 [and|or ...] to column_name1=value1,column_name2=value2
             table_name = tokens[1]
-            return ("update_set", table_name, tokens[3].split(','), tokens[5].split(','))
+            to_index = tokens.index("to", 4)
+            assignments = [assignment.strip() for assignment in " ".join(tokens[to_index + 1:]).split(',')]
+            return ("update_set", table_name, " ".join(tokens[3:to_index]).split(','), assignments)
         elif tokens[0] == "select" and tokens[1] == "from" and tokens[3] == "that":
-            # Format: select from table_name that column_name1=value1,column_name2=value2
+            # Format: select from table_name that column_name1=value1,column_name2=value2 [and|or ...]
             table_name = tokens[2]
-            return ("select_from", table_name, tokens[4].split(','))
+            return ("select_from", table_name, " ".join(tokens[4:]).split(','))
         elif tokens[0] == "select":
             return self.parse_select_query(tokens)
         else:
             return ("unknown",)
         
     def parse_select_query(self, tokens):
-        # Initialize default values for optional parts
-        condition_clause, join_clause, groupby_clause, orderby_clause = None, None, None, None
-
-        # Parse 'select' clause
-        select_index = tokens.index("from")
-        select_clause = tokens[1:select_index]
-        select_clause = [item.strip() for item in " ".join(select_clause).split(',')]
-
-        # Parse 'from' clause
-        from_index = tokens.index("from")
+        # Find every clause keyword in one pass, each clause runs up to the next one
+        positions = {}
+        for index, token in enumerate(tokens):
+            if token in SELECT_CLAUSES and token not in positions:
+                positions[token] = index
+        bounds = sorted(positions.values()) + [len(tokens)]
+
+        def clause(keyword):
+            if keyword not in positions:
+                return None
+            start = positions[keyword]
+            return " ".join(tokens[start + 1:bounds[bounds.index(start) + 1]])
+
+        # Parse 'select' and 'from' clauses
+        from_index = positions["from"]
+        select_clause = [item.strip() for item in " ".join(tokens[1:from_index]).split(',')]
         table_name = tokens[from_index + 1]
 
-        # Check for 'join' clause and 'that' as part of 'join'
-        if "join" in tokens:
-            join_index = tokens.index("join")
-            join_end_index = tokens.index("groupby") if "groupby" in tokens else tokens.index("orderby") if "orderby" in tokens else len(tokens)
-            join_clause = " ".join(tokens[join_index + 1:join_end_index])
-            # Extract 'that' clause from join, if present
-            if "that" in join_clause:
-                join_parts = join_clause.split("that")
-                join_clause = join_parts[0].strip()
-                condition_clause = join_parts[1].strip()
-        
-        # Check for standalone 'that' clause (conditions)
-        elif "that" in tokens:
-            that_index = tokens.index("that")
-            that_end_index = tokens.index("groupby") if "groupby" in tokens else tokens.index("orderby") if "orderby" in tokens else len(tokens)
-            condition_clause = " ".join(tokens[that_index + 1:that_end_index])
-
-        # Check for 'groupby' clause
-        if "groupby" in tokens:
-            groupby_index = tokens.index("groupby")
-            groupby_end_index = tokens.index("orderby") if "orderby" in tokens else len(tokens)
-            groupby_clause = " ".join(tokens[groupby_index + 1:groupby_end_index])
-
-        # Check for 'order by' clause
-        if "orderby" in tokens:
-            orderby_index = tokens.index("orderby")
-            orderby_clause = " ".join(tokens[orderby_index + 1:])
+        # A 'that' clause after a join holds the conditions on the joined rows
+        join_clause = clause("join")
+        condition_clause = clause("that")
+        groupby_clause = clause("groupby")
+        orderby_clause = clause("orderby")
+        limit_clause = clause("limit")
+        offset_clause = clause("offset")
 
         return {
             "type": "select",
@@ -542,14 +1342,118 @@ class Parser:
             "columns": select_clause,
             "join": join_clause,
             "groupby": groupby_clause.split(',') if groupby_clause else None,
-            "orderby": orderby_clause.split(',') if orderby_clause else None    
+            "orderby": orderby_clause.split(',') if orderby_clause else None,
+            "limit": int(limit_clause) if limit_clause else None,
+            "offset": int(offset_clause) if offset_clause else 0
         }
 
 
+class Slot:
+    """A '?' placeholder of a prepared command, filled with one parameter each time the command runs."""
 
+    def __init__(self, condition):
+        self.condition = condition  # The value of a comparison in a condition, where 'and'/'or' would split it
+
+    def __repr__(self):
+        return '?'
+
+
+VALUE_SLOT = Slot(condition=False)
+CONDITION_SLOT = Slot(condition=True)
+
+
+class Text(tuple):
+    """Pieces of text with Slots among them, joined into one string once the slots are filled."""
+
+
+def condition_text(condition):
+    # The condition as Text with a CONDITION_SLOT for each comparison whose value is '?', or as it is without any
+    pieces = []
+    for group_number, terms in enumerate(split_condition(condition)):
+        if group_number:
+            pieces.append(" or ")
+        for term_number, term in enumerate(terms):
+            if term_number:
+                pieces.append(" and ")
+            match = CONDITION_PATTERN.fullmatch(term.strip())
+            if match and match.group(3).strip() == '?':
+                pieces += [match.group(1).strip() + match.group(2), CONDITION_SLOT]
+            else:
+                pieces.append(term)
+    return Text(pieces) if CONDITION_SLOT in pieces else condition
+
+
+def assignment_text(assignment):
+    column, _, value = assignment.partition('=')
+    return Text([column.strip() + '=', VALUE_SLOT]) if value.strip() == '?' else assignment
+
+
+def command_template(action):
+    """A parsed command with every value slot holding a '?' turned into Text."""
+    if isinstance(action, dict):
+        conditions = action["conditions"]
+        return {**action, "conditions": [condition_text(condition) for condition in conditions] if conditions else conditions}
+    elif action[0] in ("delete_from", "select_from"):
+        return action[:2] + ([condition_text(condition) for condition in action[2]],)
+    elif action[0] == "update_set":
+        return action[:2] + ([condition_text(condition) for condition in action[2]], [assignment_text(assignment) for assignment in action[3]])
+    elif action[0] == "insert_into":
+        return action[:2] + ([Text([VALUE_SLOT]) if value.strip() == '?' else value for value in action[2]],)
+    return action
+
+
+def count_slots(template):
+    if isinstance(template, Text):
+        return sum(isinstance(piece, Slot) for piece in template)
+    elif isinstance(template, dict):
+        return sum(count_slots(value) for value in template.values())
+    elif isinstance(template, (list, tuple)):
+        return sum(count_slots(value) for value in template)
+    return 0
+
+
+def fill_slots(template, fill):
+    # A copy of a command template with its Text joined, each slot replaced by fill(slot)
+    if isinstance(template, Text):
+        return ''.join(fill(piece) if isinstance(piece, Slot) else piece for piece in template)
+    elif isinstance(template, dict):
+        return {key: fill_slots(value, fill) for key, value in template.items()}
+    elif isinstance(template, (list, tuple)):
+        return type(template)(fill_slots(value, fill) for value in template)
+    return template
+
+
+class PreparedCommand:
+    """
+    A command parsed once, with its '?' placeholders located, and run any number of times with different
+    parameters. A placeholder is a whole value slot of the parsed command: the value of one comparison in
+    a condition, one inserted value or the value of one assignment. Parameters are bound as literals of
+    their slot, and values that would parse as more than one are rejected.
+    """
+
+    def __init__(self, action):
+        self.action = action
+        self.template = command_template(action)
+        self.slot_count = count_slots(self.template)
+
+    def bind(self, params=()):
+        """The parsed command with params bound to its placeholders, in order. The result must not be modified."""
+        if len(params) != self.slot_count:
+            raise ValueError(f"The command takes {self.slot_count} parameters, {len(params)} given.")
+        if not self.slot_count:
+            return self.action
+        params = iter([str(param).lower() for param in params])  # Commands are lowercased when parsed
+
+        def fill(slot):
+            value = next(params).strip()
+            # Commas separate conditions and values, and lines separate the rows of a table file
+            if re.search(r"[,\r\n]", value) or (slot.condition and re.search(r"\s(and|or)(\s|$)", value)):
+                raise ValueError(f"Parameter {value!r} is not a single value.")
+            return value
+
+        return fill_slots(self.template, fill)
 
 
-    
 def cli():
     db = Database()
     parser = Parser()
@@ -564,30 +1468,42 @@ def cli():
         result = None
         action = parser.parse(command)
         if isinstance(action, dict):
-            result = db.select_from(table_name=action['from'], conditions=action['conditions'], columns=action['columns'], join=action['join'], groupby=action['groupby'], order_by=action['orderby'])
+            result = db.select_from(table_name=action['from'], conditions=action['conditions'], columns=action['columns'], join=action['join'], groupby=action['groupby'], order_by=action['orderby'],
+                                    limit=action['limit'], offset=action['offset'])
+            # Print the result rather than the path of a file in a temp directory that is removed here
+            result = db.read_result(result)
         else:
             if action[0] == "create_table":
                 result = db.create_table(action[1], action[2])
+            elif action[0] == "create_index":
+                result = db.create_index(action[1], action[2])
             elif action[0] == "insert_into":
                 result = db.insert_into(action[1], action[2])
             elif action[0] == "display_table":
-                result = db.display_table(action[1])
+                with db.table_locks.read(action[1]):
+                    result = db.read_result(db.display_table(action[1]))
             elif action[0] == "delete_from":
                 result = db.delete_from(action[1], action[2])
             elif action[0] == "update_set":
                 result = db.update_set(action[1], action[2], action[3])
+            elif action[0] == "vacuum":
+                result = db.vacuum(action[1])
             elif action[0] == "select_from":
-                result = db.select_from(action[1], action[2])
+                result = db.read_result(db.select_from(action[1], action[2]))
             else:
                 result = "Unknown command or not yet implemented."
         print(result)
         # return results to api
         
 class API:
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, result_cache_bytes=RESULT_CACHE_BYTES, **kwargs):
         print("YSH API init")
+        # One database for the whole process, its schema catalog is refreshed per command
+        self.db = Database()
+        self.parser = Parser()
+        self.result_cache = LRUCache(result_cache_bytes)  # (query, table versions) -> JSON result
     
-    def csv_to_json(self,file_path):
+    def csv_to_json(self,file_path, compact=False):
         print("csv_to_json")
         with open(file_path, 'r', encoding='utf-8') as file:
             # Read the first line as headers
@@ -600,8 +1516,18 @@ class API:
             reader = csv.DictReader(file, fieldnames=headers)
             data_list = [row for row in reader]
 
+            # Compact JSON has no indentation and no spaces after separators
+            if compact:
+                return json.dumps(data_list, separators=(',', ':'))
             return json.dumps(data_list, indent=4)
     
+    def result_to_json(self, file_path, compact=False):
+        # The result and intermediate files are not needed once the result is read
+        try:
+            return self.csv_to_json(file_path, compact)
+        finally:
+            self.db.remove_query_dir(os.path.dirname(file_path))
+
     def handle_multiple_commands(self,input_command):
         print("handle_multiple_commands")
         input_commands = input_command.split(';')
@@ -616,44 +1542,108 @@ class API:
         return f"{count} commands executed successfully."
             
             
-    def handle_input(self,input_command):
+    def prepare(self, input_command):
+        """Parse a command with '?' placeholders once; run it with execute(prepared, params)."""
+        return self.parser.prepare(input_command.strip())
+
+    def stream(self, input_command, params=()):
+        """
+        Run a select and return an iterator over its result rows, as dicts, that pulls them from the
+        pipeline as they are produced instead of reading a result file. Returns None for other commands.
+        Streamed results are not cached.
+        """
+        prepared = self.prepare(input_command)
+        if not isinstance(prepared.action, dict):
+            return None
+        self.db.load_table_mapping()
+        action = prepared.bind(params)
+        if action['from'] not in self.db.tables:
+            raise ValueError(f"Table {action['from']} does not exist.")
+        rows = self.stream_rows(action)
+        next(rows)  # Build the pipeline now, so a bad select fails before anything is sent
+        return rows
+
+    def stream_rows(self, action):
+        # The tables stay read-locked until the last row is sent or the stream is dropped
+        db = self.db
+        query_dir = db.make_query_dir()
+        try:
+            with db.table_locks.read(*db.read_tables(action['from'], action['join'])):
+                pipeline = db.select_pipeline(table_name=action['from'], conditions=action['conditions'], columns=action['columns'], join=action['join'], groupby=action['groupby'], order_by=action['orderby'],
+                                              limit=action['limit'], offset=action['offset'], temp_dir=query_dir)
+                yield None
+                for row in pipeline.rows():
+                    # Values as they would read back from the result file
+                    yield dict(zip(pipeline.headers, ['' if value is None else str(value) for value in row]))
+        finally:
+            db.remove_query_dir(query_dir)
+
+    def handle_input(self,input_command, params=(), compact=False):
         if ';' in input_command:
             return self.handle_multiple_commands(input_command)
 
         try:  
             print(input_command)
-            db = Database()
-            parser = Parser()
-
             command = input_command.strip()
 
             if command.lower().startswith("show tables"):
-                print(db.display_tables())
+                print(self.db.display_tables())
+
+            return self.execute(self.parser.prepare(command), params, compact)
+        except Exception as e:
+            print(e)
+            return "Invalid Command!"
+
+    def execute(self, prepared, params=(), compact=False):
+        """
+        Run a PreparedCommand with params bound to its '?' placeholders in order.
+        Results are JSON, indented unless compact.
+        """
+        try:
+            db = self.db
+            db.load_table_mapping()
+            action = prepared.bind(params)
 
             result = None
-            action = parser.parse(command)
             if isinstance(action, dict):
-                result = db.select_from(table_name=action['from'], conditions=action['conditions'], columns=action['columns'], join=action['join'], groupby=action['groupby'], order_by=action['orderby'])
-                return self.csv_to_json(result)
+                # Identical selects are answered from the cache until a table they read is written to
+                tables = db.read_tables(action['from'], action['join'])
+                # The storage signature catches writes by other processes, which table_versions never sees
+                cache_key = (json.dumps(action, sort_keys=True),
+                             tuple((table, db.table_versions.get(table, 0), db.storage_signature(table)) for table in tables), compact)
+                result = self.result_cache.get(cache_key)
+                if result is None:
+                    result = db.select_from(table_name=action['from'], conditions=action['conditions'], columns=action['columns'], join=action['join'], groupby=action['groupby'], order_by=action['orderby'],
+                                            limit=action['limit'], offset=action['offset'])
+                    result = self.result_to_json(result, compact)
+                    self.result_cache.put(cache_key, result, len(result))
+                return result
             else:
                 if action[0] == "create_table":
                     result = db.create_table(action[1], action[2])
                     result = "Create Success!"
+                elif action[0] == "create_index":
+                    result = db.create_index(action[1], action[2])
                 elif action[0] == "insert_into":
                     result = db.insert_into(action[1], action[2])
                     result = "Add Success!"
                 elif action[0] == "display_table":
-                    result = self.csv_to_json(db.display_table(action[1]))
+                    # The table file itself is read, so writers have to wait
+                    with db.table_locks.read(action[1]):
+                        result = self.result_to_json(db.display_table(action[1]), compact)
                 elif action[0] == "delete_from":
                     result = db.delete_from(action[1], action[2])
                     result = "Delete Success!"
                 elif action[0] == "update_set":
                     result = db.update_set(action[1], action[2], action[3])
                     result = "Update Success!"
+                elif action[0] == "vacuum":
+                    result = db.vacuum(action[1])
+                    result = "Vacuum Success!"
                 elif action[0] == "select_from":
-                    pirnt("select_from")
+                    print("select_from")
                     result = db.select_from(action[1], action[2])
-                    return self.csv_to_json(result)
+                    return self.result_to_json(result, compact)
                 else:
                     result = "Unknown command or not yet implemented."
             return result
@@ -663,33 +1653,6 @@ class API:
             return "Invalid Command!"
     
 
-def read_csv_in_chunks(file_path, chunk_size=CHUNK_SIZE):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        reader = csv.reader(file)
-        chunk = []
-        for i, row in enumerate(reader):
-            chunk.append(row)
-            if (i + 1) % chunk_size == 0:
-                yield chunk
-                chunk = []
-        if chunk:
-            yield chunk
-            
-def read_csv_in_chunks_group(file_path, chunk_size=1024):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        reader = csv.reader(file)
-        chunk = []
-        for i, row in enumerate(reader):
-            if i == 0:
-                headers = row  # Capture headers to yield with each chunk
-                continue
-            chunk.append(row)
-            if (i % chunk_size == 0) or (i == 0):
-                yield headers, chunk
-                chunk = []
-        if chunk:
-            yield headers, chunk
-
 if __name__ == "__main__":
     cli()
     
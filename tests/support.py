@@ -0,0 +1,56 @@
+"""Fixtures shared by the tests: every test gets a database of its own in a temporary directory."""
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from db import MyDB
+from rdb import API
+
+
+def quietly(function, *args, **kwargs):
+    """Call function with the progress messages the databases print discarded."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+
+class MyDBTestCase(unittest.TestCase):
+    """A test with an empty MyDB, self.db; open_db opens another on the same files, as a restarted process would."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.data_dir = os.path.join(self.tmp.name, 'tables')
+        os.mkdir(self.data_dir)
+        self.db = self.open_db()
+
+    def open_db(self, **options):
+        options.setdefault('sync_log', False)
+        return quietly(MyDB, metadata_file=os.path.join(self.tmp.name, 'metadata.json'), data_dir=self.data_dir, **options)
+
+    def query(self, statement, db=None):
+        return quietly((db or self.db).query, statement)
+
+
+class RdbTestCase(unittest.TestCase):
+    """A test with an rdb API, self.api, run in an empty working directory of its own, where rdb keeps its tables."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.tmp.name)
+        self.api = quietly(API)
+
+    def run_commands(self, *commands):
+        for command in commands:
+            result = quietly(self.api.handle_input, command)
+            self.assertNotEqual(result, "Invalid Command!", command)
+
+    def select(self, command, params=()):
+        """The rows of a select, as dicts of the values in the result file."""
+        result = quietly(self.api.handle_input, command, params, compact=True)
+        self.assertNotEqual(result, "Invalid Command!", command)
+        return json.loads(result)
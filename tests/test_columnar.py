@@ -0,0 +1,46 @@
+import os
+import unittest
+
+from support import MyDBTestCase, quietly
+
+
+ROWS = [{'id': 1, 'score': 1.5, 'name': 'ana'}, {'id': 2, 'score': -0.25, 'name': 'zoë'}, {'id': 3, 'score': 0.0, 'name': ''}]
+
+
+class ColumnarTableTest(MyDBTestCase):
+    """Tables converted to column files read back the same rows, and still take writes."""
+
+    def setUp(self):
+        super().setUp()
+        self.db = self.open_db(compact_threshold=3)
+        quietly(self.db.create_table, 'emp', {'id': 'int', 'score': 'float', 'name': 'string'})
+        quietly(self.db.insert_many, 'emp', ROWS)
+        quietly(self.db.convert_table, 'emp', 'columnar')
+
+    def test_round_trip(self):
+        self.assertTrue(os.path.isdir(self.db.columns_dir('emp')))
+        self.assertEqual(self.open_db().load_table_data('emp'), ROWS)
+        quietly(self.db.convert_table, 'emp', 'json')
+        self.assertFalse(os.path.exists(self.db.columns_dir('emp')))
+        self.assertEqual(self.open_db().load_table_data('emp'), ROWS)
+
+    def test_columns_are_memory_mapped_views(self):
+        ids = self.db.load_column('emp', 'id')
+        self.assertIsInstance(ids, memoryview)
+        self.assertEqual(list(ids), [1, 2, 3])
+        self.assertEqual(list(self.db.load_column('emp', 'name')), ['ana', 'zoë', ''])
+
+    def test_writes_after_conversion(self):
+        quietly(self.db.insert, 'emp', {'id': 4, 'score': 2.0, 'name': 'b'})
+        self.assertEqual(self.db.load_column('emp', 'id'), [1, 2, 3, 4])
+        quietly(self.db.delete, 'emp', "id = 1")
+        quietly(self.db.insert, 'emp', {'id': 5, 'score': 3.0, 'name': 'c'})
+        # The log was folded back into column files
+        self.assertFalse(os.path.exists(self.db.log_file('emp')))
+        self.assertEqual(self.db.table_format('emp'), 'columnar')
+        self.assertEqual(list(self.db.load_column('emp', 'id')), [2, 3, 4, 5])
+        self.assertEqual(self.query("SELECT name FROM emp WHERE score > 1", self.open_db()), [{'name': 'b'}, {'name': 'c'}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+
+from support import MyDBTestCase, quietly
+
+
+class QuotedStringIndexTest(MyDBTestCase):
+    """Indexed lookups must match the rows a scan finds, for string values stored with their quotes."""
+
+    def setUp(self):
+        super().setUp()
+        quietly(self.db.create_table, 'emp', {'id': 'int', 'name': 'string'})
+        # Values as the CLI inserts them, quotes included
+        quietly(self.db.insert_many, 'emp', [{'id': 1, 'name': "'a'"}, {'id': 2, 'name': "'b'"}, {'id': 3, 'name': "'c'"}])
+
+    def test_select_through_index(self):
+        quietly(self.db.create_index, 'emp', 'name')
+        self.assertEqual(self.query("SELECT * FROM emp WHERE name = 'b'"), [{'id': 2, 'name': "'b'"}])
+        self.assertEqual(self.query("SELECT id FROM emp WHERE name = 'b' AND id = 2"), [{'id': 2}])
+
+    def test_range_through_btree_index(self):
+        quietly(self.db.create_index, 'emp', 'name', 'btree')
+        self.assertEqual(self.query("SELECT id FROM emp WHERE name >= 'b'"), [{'id': 2}, {'id': 3}])
+
+    def test_delete_and_update_through_index(self):
+        quietly(self.db.create_index, 'emp', 'name')
+        quietly(self.db.delete, 'emp', "name = 'b'")
+        quietly(self.db.update, 'emp', {'id': 7}, "name = 'c'")
+        self.assertEqual(self.db.load_table_data('emp'), [{'id': 1, 'name': "'a'"}, {'id': 7, 'name': "'c'"}])
+
+    def test_rows_inserted_after_index(self):
+        quietly(self.db.create_index, 'emp', 'name')
+        self.query("SELECT * FROM emp WHERE name = 'a'")
+        quietly(self.db.insert, 'emp', {'id': 4, 'name': "'d'"})
+        self.assertEqual(self.query("SELECT id FROM emp WHERE name = 'd'"), [{'id': 4}])
+
+
+class IndexMaintenanceTest(MyDBTestCase):
+    """Loaded indexes follow the table through deletes and updates, and through writes by other processes."""
+
+    def setUp(self):
+        super().setUp()
+        quietly(self.db.create_table, 'emp', {'id': 'int', 'dept': 'string'})
+        quietly(self.db.insert_many, 'emp', [{'id': i, 'dept': "'x'" if i % 2 else "'y'"} for i in range(1, 9)])
+        quietly(self.db.create_index, 'emp', 'id', 'btree')
+        quietly(self.db.create_index, 'emp', 'dept')
+
+    def test_delete_and_update_keep_loaded_indexes(self):
+        indexes = dict(self.db.indexes)
+        quietly(self.db.delete, 'emp', "id <= 2")
+        quietly(self.db.update, 'emp', {'dept': "'z'"}, "id = 5")
+        quietly(self.db.update, 'emp', {'id': 50}, "id = 6")
+        self.assertEqual(self.db.indexes, indexes)
+        self.assertEqual(self.query("SELECT id FROM emp WHERE dept = 'z'"), [{'id': 5}])
+        self.assertEqual(self.query("SELECT id FROM emp WHERE dept = 'x'"), [{'id': 3}, {'id': 7}])
+        self.assertEqual(self.query("SELECT id FROM emp WHERE id >= 7"), [{'id': 50}, {'id': 7}, {'id': 8}])
+        # A restarted process, which has to rebuild them, finds the same rows
+        self.assertEqual(self.query("SELECT id FROM emp WHERE id >= 7", self.open_db()), [{'id': 50}, {'id': 7}, {'id': 8}])
+
+    def test_write_by_another_process(self):
+        self.assertEqual(self.query("SELECT id FROM emp WHERE dept = 'x'"), [{'id': 1}, {'id': 3}, {'id': 5}, {'id': 7}])
+        # The row count stays the same
+        other = self.open_db()
+        quietly(other.delete, 'emp', "id = 1")
+        quietly(other.insert, 'emp', {'id': 9, 'dept': "'x'"})
+        self.assertEqual(self.query("SELECT id FROM emp WHERE dept = 'x'"), [{'id': 3}, {'id': 5}, {'id': 7}, {'id': 9}])
+        self.assertEqual(self.query("SELECT dept FROM emp WHERE id = 2"), [{'dept': "'y'"}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import json
+import unittest
+
+from support import MyDBTestCase, RdbTestCase, quietly
+
+
+class RdbParameterTest(RdbTestCase):
+    """rdb binds parameters to the '?' value slots of a prepared command, and only there."""
+
+    def setUp(self):
+        super().setUp()
+        self.run_commands("make table persons name:str,age:int", "add into persons a,24", "add into persons b,40")
+
+    def execute(self, command, params=()):
+        return quietly(self.api.execute, self.api.prepare(command), params, True)
+
+    def test_prepared_command_is_cached_and_rebound(self):
+        prepared = self.api.prepare("select name from persons that age>?")
+        self.assertIs(self.api.prepare("select name from persons that age>?"), prepared)
+        self.assertEqual(json.loads(self.execute("select name from persons that age>?", [30])), [{'name': 'b'}])
+        self.assertEqual(json.loads(self.execute("select name from persons that age>?", [0])), [{'name': 'a'}, {'name': 'b'}])
+
+    def test_parameter_count_is_checked(self):
+        self.assertEqual(self.execute("select name from persons that name=?"), "Invalid Command!")
+        self.assertEqual(self.execute("select name from persons that name=a", ['b']), "Invalid Command!")
+        self.assertEqual(self.execute("add into persons ?,?", ['c']), "Invalid Command!")
+
+    def test_parameter_cannot_change_the_condition(self):
+        self.assertEqual(self.execute("select name from persons that name=?", ['nobody or age>0']), "Invalid Command!")
+        self.assertEqual(self.execute("delete from persons that name=?", ['a,age>0']), "Invalid Command!")
+        self.assertEqual(self.select("select name from persons"), [{'name': 'a'}, {'name': 'b'}])
+
+    def test_insert_and_update_slots(self):
+        self.execute("add into persons ?,?", ['c', 7])
+        self.execute("update persons that name=? to age=?", ['c', 8])
+        self.assertEqual(self.select("select age from persons that name=c"), [{'age': '8'}])
+
+
+class MyDBParameterTest(MyDBTestCase):
+
+    def setUp(self):
+        super().setUp()
+        quietly(self.db.create_table, 'emp', {'id': 'int', 'name': 'string'})
+        quietly(self.db.insert_many, 'emp', [{'id': 1, 'name': "'a'"}, {'id': 2, 'name': "'b'"}])
+
+    def test_explain_binds_parameters(self):
+        quietly(self.db.create_index, 'emp', 'id')
+        self.assertTrue(self.db.explain("SELECT * FROM emp WHERE id = ?", [2]).startswith("Index lookup on emp using hash index on id (id = 2)"))
+        with self.assertRaises(ValueError):
+            self.db.explain("SELECT * FROM emp WHERE id = ?")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+
+from rdb import Database
+from support import RdbTestCase, quietly
+
+
+class GroupByAggregateTest(RdbTestCase):
+    """GROUP BY computes every aggregate in one pass, and spills groups to disk when they do not fit."""
+
+    QUERY = "select country,sum(age),max(age),min(age),avg(age),count(name) from persons groupby country orderby country"
+
+    def setUp(self):
+        super().setUp()
+        self.run_commands("make table persons name:str,country:str,age:int", "add into persons a,China,24",
+                          "add into persons b,India,40", "add into persons c,China,26", "add into persons d,US,10",
+                          "add into persons e,Peru,31", "add into persons f,India,20", "add into persons g,Chile,8")
+
+    def test_aggregates_of_one_column(self):
+        china, india = self.select(self.QUERY)[1:3]
+        self.assertEqual(china, {'country': 'china', 'sum(age)': '50.0', 'max(age)': '26.0', 'min(age)': '24.0',
+                                 'avg(age)': '25.0', 'count(name)': '2'})
+        self.assertEqual((india['sum(age)'], india['avg(age)'], india['count(name)']), ('60.0', '30.0', '2'))
+
+    def test_spilled_groups_match_in_memory_groups(self):
+        in_memory = self.select(self.QUERY)
+        self.api.db = quietly(Database, max_groups=2, group_partitions=3)
+        self.api.result_cache.clear()
+        self.assertEqual(self.select(self.QUERY), in_memory)
+        self.assertEqual(len(in_memory), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+
+from rdb import Database, ParallelScan
+from support import RdbTestCase, quietly
+
+
+class ParallelScanTest(RdbTestCase):
+    """Scans and GROUP BYs split across worker processes return what a single process does."""
+
+    QUERIES = ["select name,age from persons that age>30", "select country,sum(age),count(name) from persons groupby country",
+               "select name from persons that country=india orderby age desc limit 3"]
+
+    def setUp(self):
+        super().setUp()
+        self.run_commands("make table persons name:str,country:str,age:int",
+                          *[f"add into persons p{i},{('china', 'india', 'us')[i % 3]},{i % 60}" for i in range(300)],
+                          "delete from persons that age=7")
+
+    def test_results_match_serial_scan(self):
+        serial = [self.select(query) for query in self.QUERIES]
+        self.api.db = quietly(Database, scan_workers=3, parallel_scan_min_bytes=0)
+        self.api.result_cache.clear()
+        self.assertIsInstance(quietly(self.api.db.table_source, 'persons', None, ['*']), ParallelScan)
+        self.assertEqual([self.select(query) for query in self.QUERIES], serial)
+
+
+if __name__ == '__main__':
+    unittest.main()
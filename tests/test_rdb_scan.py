@@ -0,0 +1,40 @@
+import csv
+import unittest
+
+from rdb import Database, scan_csv, split_csv_ranges
+from support import RdbTestCase, quietly
+
+# Quoted fields holding newlines, a carriage return, a Unicode line separator and an escaped quote
+ROWS = [['a', 'one\nline', '1'], ['b', 'two\r\nlines "quoted"', '2'], ['c', 'plain', '3'],
+        ['d', 'para graph\n', '4'], ['e', '"', '5']] * 20
+
+
+class MultilineFieldTest(RdbTestCase):
+    """Table files are cut into batches, ranges and rows on row boundaries, never inside a quoted field."""
+
+    def setUp(self):
+        super().setUp()
+        with open('notes.csv', 'w', newline='', encoding='utf-8') as file:
+            csv.writer(file).writerows([['name', 'note', 'n'], ['str', 'str', 'int']] + ROWS)
+
+    def stream(self, command):
+        return [[row['name'], row['note'], row['n']] for row in quietly(self.api.stream, command)]
+
+    def test_batches_and_ranges(self):
+        for batch_bytes in (1, 7, 64 * 1024):
+            self.assertEqual([row for batch in scan_csv('notes.csv', batch_bytes=batch_bytes) for row in batch], ROWS)
+        ranges = split_csv_ranges('notes.csv', 16)
+        self.assertEqual([row for start, end in ranges for batch in scan_csv('notes.csv', start=start, end=end) for row in batch], ROWS)
+
+    def test_parallel_scan(self):
+        self.api.db = quietly(Database, scan_workers=4, parallel_scan_min_bytes=0)
+        self.assertEqual(self.stream("select name,note,n from notes"), ROWS)
+
+    def test_delete_and_index(self):
+        self.run_commands("delete from notes that name=b", "make index notes name")
+        self.assertEqual(self.stream("select name,note,n from notes"), [row for row in ROWS if row[0] != 'b'])
+        self.assertEqual(self.stream("select name,note,n from notes that name=d"), [row for row in ROWS if row[0] == 'd'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,27 @@
+import unittest
+
+from support import RdbTestCase
+
+
+class GroupByOrderTest(RdbTestCase):
+    """A GROUP BY can be ordered by its group column or by one of its aggregates."""
+
+    def setUp(self):
+        super().setUp()
+        self.run_commands("make table persons name:str,country:str,age:int", "add into persons a,China,24",
+                          "add into persons b,India,40", "add into persons c,China,26", "add into persons d,US,10")
+
+    def test_order_by_aggregate(self):
+        self.assertEqual(self.select("select country,sum(age) from persons groupby country orderby sum(age)"),
+                         [{'country': 'us', 'sum(age)': '10.0'}, {'country': 'india', 'sum(age)': '40.0'},
+                          {'country': 'china', 'sum(age)': '50.0'}])
+        self.assertEqual(self.select("select country,sum(age) from persons groupby country orderby sum(age) desc limit 1"),
+                         [{'country': 'china', 'sum(age)': '50.0'}])
+
+    def test_order_by_group_column(self):
+        self.assertEqual([row['country'] for row in self.select("select country,count(name) from persons groupby country orderby country")],
+                         ['china', 'india', 'us'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import unittest
+
+from rdb import API
+from support import RdbTestCase, quietly
+
+
+class TombstoneTest(RdbTestCase):
+    """Deletes and updates mark rows dead in a sidecar file instead of rewriting the table file."""
+
+    def setUp(self):
+        super().setUp()
+        self.run_commands("make table persons name:str,age:int",
+                          *(f"add into persons p{i},{i}" for i in range(10)))
+
+    def names(self, condition=""):
+        return [row['name'] for row in self.select(f"select name from persons {condition}")]
+
+    def test_delete_appends_tombstone(self):
+        size = os.path.getsize("persons.csv")
+        self.run_commands("delete from persons that age = 3")
+        self.assertEqual(os.path.getsize("persons.csv"), size)
+        self.assertTrue(os.path.exists("persons.del"))
+        self.assertNotIn('p3', self.names())
+        self.assertEqual(self.names("that age < 5"), ['p0', 'p1', 'p2', 'p4'])
+
+    def test_update_replaces_row(self):
+        self.run_commands("update persons that name = p4 to age=40")
+        self.assertEqual(self.select("select name,age from persons that name = p4"), [{'name': 'p4', 'age': '40'}])
+        self.assertEqual(len(self.names()), 10)
+
+    def test_vacuum_removes_dead_rows(self):
+        self.run_commands("delete from persons that age = 3", "update persons that name = p4 to age=40")
+        size = os.path.getsize("persons.csv")
+        self.run_commands("vacuum persons")
+        self.assertLess(os.path.getsize("persons.csv"), size)
+        self.assertFalse(os.path.exists("persons.del"))
+        self.assertEqual(len(self.names()), 9)
+        # A restarted process reads the same rows
+        self.api = quietly(API)
+        self.assertEqual(len(self.names()), 9)
+
+    def test_torn_tombstone_is_ignored(self):
+        self.run_commands("delete from persons that age = 3")
+        # A crash in the middle of an append to the sidecar
+        with open("persons.del", "a") as file:
+            file.write("12")
+        self.api = quietly(API)
+        self.assertEqual(len(self.names()), 9)
+        self.run_commands("delete from persons that age = 5")
+        self.assertEqual(self.names("that age < 7"), ['p0', 'p1', 'p2', 'p4', 'p6'])
+
+
+if __name__ == '__main__':
+    unittest.main()
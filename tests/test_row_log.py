@@ -0,0 +1,48 @@
+import json
+import os
+import unittest
+
+from support import MyDBTestCase, quietly
+
+
+class RowLogTest(MyDBTestCase):
+    """Inserts append to the table's row log, which reads replay and checkpoints fold into the JSON file."""
+
+    def setUp(self):
+        super().setUp()
+        self.db = self.open_db(compact_threshold=5)
+        quietly(self.db.create_table, 'emp', {'id': 'int', 'name': 'string'})
+
+    def ids(self, db=None):
+        return [row['id'] for row in self.query("SELECT id FROM emp", db)]
+
+    def test_insert_appends_without_rewriting_the_table(self):
+        table_file = self.db.table_file('emp')
+        before = os.stat(table_file)
+        quietly(self.db.insert, 'emp', {'id': 1, 'name': 'a'})
+        quietly(self.db.insert_many, 'emp', [{'id': 2, 'name': 'b'}, {'id': 3, 'name': 'c'}])
+        after = os.stat(table_file)
+        self.assertEqual((after.st_mtime_ns, after.st_size), (before.st_mtime_ns, before.st_size))
+        with open(self.db.log_file('emp')) as file:
+            self.assertEqual([json.loads(line)['row']['id'] for line in file], [1, 2, 3])
+        self.assertEqual(self.ids(self.open_db()), [1, 2, 3])
+
+    def test_log_is_folded_into_the_table_at_the_threshold(self):
+        quietly(self.db.insert_many, 'emp', [{'id': i, 'name': 'x'} for i in range(4)])
+        quietly(self.db.delete, 'emp', "id = 0")
+        self.assertFalse(os.path.exists(self.db.log_file('emp')))
+        with open(self.db.table_file('emp')) as file:
+            self.assertEqual([row['id'] for row in json.load(file)], [1, 2, 3])
+
+    def test_table_without_log(self):
+        # A table saved as a JSON file only, as before the row log
+        with open(self.db.table_file('emp'), 'w') as file:
+            json.dump([{'id': 1, 'name': 'a'}], file)
+        db = self.open_db()
+        quietly(db.insert, 'emp', {'id': 2, 'name': 'b'})
+        self.assertEqual(self.ids(db), [1, 2])
+        self.assertEqual(self.ids(self.open_db()), [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+from cache import LRUCache
+from support import MyDBTestCase, quietly
+
+
+class LRUCacheTest(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(10)
+        cache.put('a', 1, 4)
+        cache.put('b', 2, 4)
+        cache.get('a')
+        cache.put('c', 3, 4)
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (1, None, 3))
+
+    def test_entry_larger_than_budget_is_not_kept(self):
+        cache = LRUCache(10)
+        cache.put('a', 1, 4)
+        cache.put('b', 2, 11)
+        self.assertEqual((cache.get('a'), cache.get('b')), (1, None))
+
+
+class TableCacheTest(MyDBTestCase):
+    """Tables are served from memory while their files are unchanged."""
+
+    def setUp(self):
+        super().setUp()
+        quietly(self.db.create_table, 'emp', {'id': 'int'})
+        quietly(self.db.insert_many, 'emp', [{'id': 1}, {'id': 2}])
+
+    def test_repeated_loads_are_served_from_cache(self):
+        rows = self.db.load_table_data('emp')
+        self.assertIs(self.db.load_table_data('emp'), rows)
+
+    def test_insert_writes_through(self):
+        rows = self.db.load_table_data('emp')
+        quietly(self.db.insert, 'emp', {'id': 3})
+        self.assertIs(self.db.load_table_data('emp'), rows)
+        self.assertEqual(rows, [{'id': 1}, {'id': 2}, {'id': 3}])
+
+    def test_write_by_another_process_invalidates(self):
+        self.db.load_table_data('emp')
+        quietly(self.open_db().insert, 'emp', {'id': 3})
+        self.assertEqual(self.db.load_table_data('emp'), [{'id': 1}, {'id': 2}, {'id': 3}])
+
+    def test_budget_evicts_least_recently_used_table(self):
+        # Room for one of the two tables, which are the same size
+        table_bytes = sum(file_signature[1] for file_signature in self.db.storage_signature('emp') if file_signature)
+        db = self.open_db(table_cache_bytes=table_bytes + 10)
+        quietly(db.create_table, 'dept', {'id': 'int'})
+        quietly(db.insert_many, 'dept', [{'id': 1}, {'id': 2}])
+        db.load_table_data('emp')
+        db.load_table_data('dept')
+        self.assertNotIn('emp', db.table_cache)
+        self.assertIn('dept', db.table_cache)
+        self.assertEqual(db.load_table_data('emp'), [{'id': 1}, {'id': 2}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+
+from support import MyDBTestCase, quietly
+import vectorized
+
+
+@unittest.skipIf(vectorized.np is None, "NumPy is not installed")
+class EngineParityTest(MyDBTestCase):
+    """The vectorized engine must return the same rows as the row engine."""
+
+    QUERIES = ["SELECT * FROM emp WHERE name = 'b'", "SELECT name, id FROM emp WHERE dept != 'y'",
+               "SELECT dept, SUM(sal) FROM emp GROUP BY dept"]
+
+    def setUp(self):
+        super().setUp()
+        quietly(self.db.create_table, 'emp', {'id': 'int', 'name': 'string', 'dept': 'string', 'sal': 'float'})
+        # String values as the CLI inserts them, quotes included
+        quietly(self.db.insert_many, 'emp', [{'id': 1, 'name': "'a'", 'dept': "'x'", 'sal': 1.0},
+                                             {'id': 2, 'name': "'b'", 'dept': "'y'", 'sal': 2.0},
+                                             {'id': 3, 'name': "'c'", 'dept': "'x'", 'sal': 3.0}])
+
+    def assert_engines_agree(self):
+        for query in self.QUERIES:
+            rows = quietly(vectorized.execute_select, self.db, self.db.parse_query(query))
+            self.assertEqual(rows, quietly(self.db.query, query, engine='row'), query)
+
+    def test_json_table(self):
+        self.assert_engines_agree()
+
+    def test_columnar_table(self):
+        quietly(self.db.convert_table, 'emp', 'columnar')
+        self.assert_engines_agree()
+
+
+if __name__ == '__main__':
+    unittest.main()
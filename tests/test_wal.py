@@ -0,0 +1,49 @@
+import json
+import unittest
+
+from support import MyDBTestCase, quietly
+
+
+class RecoveryTest(MyDBTestCase):
+    """Reopening the database after a crash keeps every committed write and nothing half-written."""
+
+    def setUp(self):
+        super().setUp()
+        quietly(self.db.create_table, 'emp', {'id': 'int'})
+        quietly(self.db.insert, 'emp', {'id': 1})
+
+    def ids(self, db):
+        return [row['id'] for row in self.query("SELECT id FROM emp", db)]
+
+    def append_to_log(self, text):
+        with open(self.db.log_file('emp'), 'a') as file:
+            file.write(text)
+
+    def test_appends_after_torn_tail_survive_restart(self):
+        # A crash in the middle of an append
+        self.append_to_log('{"op": "insert", "row": {"id": 7')
+        db = self.open_db()
+        quietly(db.insert, 'emp', {'id': 2})
+        quietly(db.insert, 'emp', {'id': 3})
+        self.assertEqual(self.ids(db), [1, 2, 3])
+        self.assertEqual(self.ids(self.open_db()), [1, 2, 3])
+
+    def test_checkpoint_marked_complete_is_installed(self):
+        # A crash after the checkpoint record, before the new snapshot was swapped in
+        with open(self.db.pending_snapshot('emp'), 'w') as file:
+            json.dump([{'id': 1}, {'id': 5}], file)
+        self.append_to_log(json.dumps({'op': 'checkpoint'}) + '\n')
+        self.assertEqual(self.ids(self.open_db()), [1, 5])
+
+    def test_unfinished_checkpoint_is_discarded(self):
+        # A crash while the new snapshot was written, before the checkpoint record
+        with open(self.db.pending_snapshot('emp'), 'w') as file:
+            file.write('[{"id": 1}, {"i')
+        db = self.open_db()
+        self.assertEqual(self.ids(db), [1])
+        quietly(db.compact_table, 'emp')
+        self.assertEqual(self.ids(self.open_db()), [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+from aggregates import AGGREGATE_FUNCTIONS
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, queries then run on the row engine
+    np = None
+
+
+class Unsupported(Exception):
+    """Raised for queries the vectorized engine cannot run; they fall back to the row engine."""
+
+
+class ColumnLoader:
+    """
+    Loads the columns a query touches as NumPy arrays, each at most once. Indexing gives the stored
+    values, which results are built from; comparable() gives the values conditions compare.
+    """
+
+    def __init__(self, db, table_name, schema):
+        self.db = db
+        self.table_name = table_name
+        self.schema = schema
+        self.arrays = {}
+        self.comparable_arrays = {}
+
+    def __getitem__(self, column):
+        if column not in self.arrays:
+            if column not in self.schema:
+                raise Unsupported(f"Unknown column '{column}'.")
+            values = self.db.load_column(self.table_name, column)
+            if self.schema[column] in ('int', 'float'):
+                # Typed memoryviews of columnar tables are wrapped without a copy
+                array = np.asarray(values) if isinstance(values, memoryview) else np.array(values)
+                if array.dtype.kind not in 'iuf':
+                    raise Unsupported(f"Column '{column}' has missing or non-numeric values.")
+            else:
+                array = np.array(values, dtype=object)
+            self.arrays[column] = array
+        return self.arrays[column]
+
+    def comparable(self, column):
+        """A column's values converted like the row engine converts them for a comparison."""
+        if column not in self.comparable_arrays:
+            array = self[column]
+            if self.schema[column] not in ('int', 'float'):
+                strip_quotes = self.db.converter(self.schema[column])
+                array = np.array([strip_quotes(value) for value in array], dtype=object)
+            self.comparable_arrays[column] = array
+        return self.comparable_arrays[column]
+
+
+def condition_mask(db, condition, columns, schema):
+    """Evaluate a WHERE condition over whole columns into a boolean mask."""
+    mask = None
+    for terms in db.parse_condition(condition):
+        group_mask = None
+        for column, operator, value in terms:
+            if column not in schema:
+                raise Unsupported(f"Unknown column '{column}'.")
+            values = columns.comparable(column)
+            literal = db.compile_literal(value, schema[column])
+            if schema[column] not in ('int', 'float') and operator not in ('=', '!='):
+                raise Unsupported("Only equality is vectorized for string columns.")
+            term_mask = np.asarray(COMPARISONS[operator](values, literal), dtype=bool)
+            group_mask = term_mask if group_mask is None else group_mask & term_mask
+        mask = group_mask if mask is None else mask | group_mask
+    return mask
+
+
+COMPARISONS = {
+    '=': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+}
+
+
+def grouped_reduce(function, values, inverse, counts, order, starts):
+    """Reduce values per group; groups are numbered by inverse and laid out by order/starts."""
+    if function == 'count':
+        return counts
+    if values.dtype.kind not in 'iuf':
+        raise Unsupported(f"{function} needs a numeric column.")
+    if function == 'sum':
+        return np.add.reduceat(values[order], starts)
+    if function == 'avg':
+        return np.add.reduceat(values[order], starts) / counts
+    if function == 'min':
+        return np.minimum.reduceat(values[order], starts)
+    if function == 'max':
+        return np.maximum.reduceat(values[order], starts)
+    raise Unsupported(f"Unsupported aggregate function: {function}")
+
+
+def group_by(columns, selected_columns, group_by_column, mask):
+    """GROUP BY with grouped reductions, groups in order of first appearance like the row engine."""
+    keys = columns[group_by_column]
+    selected = np.flatnonzero(mask) if mask is not None else np.arange(len(keys))
+    if len(selected) == 0:
+        return []
+
+    unique_keys, first_index, inverse = np.unique(keys[selected], return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    # Renumber groups by first appearance
+    appearance = np.argsort(first_index, kind='stable')
+    rank = np.empty_like(appearance)
+    rank[appearance] = np.arange(len(appearance))
+    inverse = rank[inverse]
+    first_index = first_index[appearance]
+    unique_keys = unique_keys[appearance]
+
+    counts = np.bincount(inverse)
+    order = np.argsort(inverse, kind='stable')
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    output = {group_by_column: unique_keys.tolist()}
+    for col_info in selected_columns:
+        column = col_info['column']
+        if 'function' in col_info:
+            function = col_info['function'].lower()
+            values = columns[column][selected] if function != 'count' else None
+            output[f"{function}({column})"] = grouped_reduce(function, values, inverse, counts, order, starts).tolist()
+        else:
+            output[column] = columns[column][selected][first_index].tolist()
+
+    names = list(output)
+    return [dict(zip(names, row)) for row in zip(*output.values())]
+
+
+def select(columns, selected_columns, schema, mask):
+    """Plain SELECT: take the selected columns at the rows the mask keeps."""
+    if len(selected_columns) == 1 and selected_columns[0].get('column') == '*':
+        names = list(schema)
+    else:
+        if any('function' in col_info for col_info in selected_columns):
+            raise Unsupported("Aggregates without GROUP BY run on the row engine.")
+        names = [col_info['column'] for col_info in selected_columns]
+
+    values = [columns[name] for name in names]
+    if mask is not None:
+        values = [column[mask] for column in values]
+    values = [column.tolist() for column in values]
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+
+def execute_select(db, parsed_query):
+    """
+    Run a single-table SELECT column at a time with NumPy.
+    Raises Unsupported for anything the row engine has to handle.
+    """
+    if np is None:
+        raise Unsupported("NumPy is not installed.")
+    if parsed_query.get('join'):
+        raise Unsupported("Joins run on the row engine.")
+
+    table_name = parsed_query['table']
+    schema = db.metadata[table_name]['schema']
+    columns = ColumnLoader(db, table_name, schema)
+
+    condition = parsed_query.get('condition')
+    mask = condition_mask(db, condition, columns, schema) if condition else None
+
+    if parsed_query.get('group_by'):
+        for col_info in parsed_query['columns']:
+            if col_info.get('function', 'count').lower() not in AGGREGATE_FUNCTIONS:
+                raise Unsupported(f"Unsupported aggregate function: {col_info['function']}")
+        return group_by(columns, parsed_query['columns'], parsed_query['group_by'], mask)
+    return select(columns, parsed_query['columns'], schema, mask)
@@ -0,0 +1,137 @@
+import json
+import os
+import threading
+
+
+def sync_directory(path):
+    # Make new names and renames in a directory durable; not every platform can open a directory
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def write_durably(path, data):
+    """Write data to a file and flush it to disk, for a file that is swapped in with os.replace next."""
+    with open(path, 'w') as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def drop_torn_tail(path):
+    """
+    Cut a log back to the end of its last complete line. An append interrupted by a crash can leave
+    a record without its newline, and the next append would otherwise be written onto the end of it.
+    """
+    with open(path, 'rb+') as file:
+        size = file.seek(0, os.SEEK_END)
+        end = size
+        keep = 0
+        while end > 0:
+            start = max(end - 4096, 0)
+            file.seek(start)
+            newline = file.read(end - start).rfind(b'\n')
+            if newline >= 0:
+                keep = start + newline + 1
+                break
+            end = start
+        if keep < size:
+            file.truncate(keep)
+            file.flush()
+            os.fsync(file.fileno())
+
+
+class LogFile:
+    """
+    An open log file with group commit: a writer whose appends are not yet on disk either runs
+    fsync itself or waits for the one in progress, and one fsync covers every append made before it started.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'a')
+        self.written = 0  # Appends so far
+        self.synced = 0  # Appends known to be on disk
+        self.syncing = False
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def append(self, text):
+        with self.condition:
+            self.file.write(text)
+            self.file.flush()
+            self.written += 1
+            return self.written
+
+    def commit(self, sequence):
+        """Wait until the append numbered sequence is on disk."""
+        with self.condition:
+            while self.synced < sequence and not self.closed:
+                if self.syncing:
+                    self.condition.wait()
+                    continue
+                self.syncing = True
+                target = self.written
+                fd = self.file.fileno()
+                # Later appends go on while the disk syncs, and are covered by the next fsync
+                self.condition.release()
+                try:
+                    os.fsync(fd)
+                finally:
+                    self.condition.acquire()
+                    self.syncing = False
+                    self.condition.notify_all()
+                self.synced = max(self.synced, target)
+
+    def close(self):
+        # Called once the appends are in a durable checkpoint, which releases anyone still waiting on them
+        with self.condition:
+            while self.syncing:
+                self.condition.wait()
+            self.closed = True
+            self.file.close()
+            self.condition.notify_all()
+
+
+class WriteAheadLog:
+    """
+    Appends JSON records, one per line, to per-table log files. append returns a ticket that commit
+    waits on until the records are on disk; with sync off, records are durable once the OS writes them.
+    """
+
+    def __init__(self, sync=True):
+        self.sync = sync
+        self.files = {}  # path -> open LogFile
+        self.mutex = threading.Lock()
+
+    def log_file(self, path):
+        with self.mutex:
+            log = self.files.get(path)
+            if log is None:
+                created = not os.path.exists(path)
+                log = self.files[path] = LogFile(path)
+                if created and self.sync:
+                    sync_directory(os.path.dirname(path) or '.')
+            return log
+
+    def append(self, path, records):
+        log = self.log_file(path)
+        return log, log.append(''.join(json.dumps(record) + '\n' for record in records))
+
+    def commit(self, ticket):
+        if self.sync and ticket is not None:
+            log, sequence = ticket
+            log.commit(sequence)
+
+    def close(self, path):
+        """Close a log before it is removed."""
+        with self.mutex:
+            log = self.files.pop(path, None)
+        if log is not None:
+            log.close()